@@ -0,0 +1,69 @@
+"""Compare AsyncTodoer with the blocking Todoer under many concurrent asyncio callers."""
+# benchmarks/bench_async.py
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from clitodo import BACKENDS, FSYNC_POLICIES, clitodo, database
+from clitodo.aio import AsyncTodoer
+
+async def heartbeat(lags: list, interval: float = 0.001) -> None: #Record how late the event loop wakes this task up
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def run_sync(db_path: Path, backend: str, fsync: str, callers: int, ops: int) -> None:
+    todoer = clitodo.Todoer(db_path, backend, fsync)
+
+    async def caller(number: int) -> None: #What a handler calling the blocking API does, each add stalls the loop
+        for op in range(ops):
+            todoer.add([f"Caller {number} to-do {op}"])
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(caller(number) for number in range(callers)))
+
+async def run_async(db_path: Path, backend: str, fsync: str, callers: int, ops: int) -> None:
+    async with AsyncTodoer(db_path, backend, fsync) as todoer:
+
+        async def caller(number: int) -> None:
+            for op in range(ops):
+                await todoer.add([f"Caller {number} to-do {op}"])
+
+        await asyncio.gather(*(caller(number) for number in range(callers)))
+
+async def measure(run, db_path: Path, backend: str, fsync: str, callers: int, ops: int) -> tuple:
+    """Return ops/sec and the worst event loop lag in milliseconds."""
+    lags: list = []
+    ticker = asyncio.get_running_loop().create_task(heartbeat(lags))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await run(db_path, backend, fsync, callers, ops)
+    elapsed = time.perf_counter() - start
+    ticker.cancel()
+    return callers * ops / elapsed, max(lags, default=0.0) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--callers", "-c", type=int, default=50, help="Concurrent asyncio tasks.")
+    parser.add_argument("--ops", "-n", type=int, default=20, help="Adds per task.")
+    parser.add_argument("--fsync", default="file", choices=FSYNC_POLICIES, help="fsync policy.")
+    args = parser.parse_args()
+    print(f"{'backend':<10}{'api':<7}{'ops/sec':>10}{'max lag ms':>12}")
+    for backend in BACKENDS:
+        for api, run in (("sync", run_sync), ("async", run_async)):
+            with tempfile.TemporaryDirectory() as directory:
+                db_path = Path(directory) / f"todo.{backend}"
+                database.init_database(db_path, backend)
+                rate, lag = asyncio.run(measure(run, db_path, backend, args.fsync, args.callers, args.ops))
+                count = len(clitodo.Todoer(db_path, backend).get_todo_list())
+            if count != args.callers * args.ops:
+                print(f"{backend}: expected {args.callers * args.ops} to-dos, found {count}", file=sys.stderr)
+            print(f"{backend:<10}{api:<7}{rate:>10.0f}{lag:>12.1f}")
+
+if __name__ == "__main__":
+    main()
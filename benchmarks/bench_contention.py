@@ -0,0 +1,47 @@
+"""Measure to-do adds per second while several processes write the same database."""
+# benchmarks/bench_contention.py
+
+import argparse
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+from clitodo import BACKENDS, FSYNC_POLICIES, clitodo, database
+
+def add_todos(db_path: Path, backend: str, fsync: str, count: int, worker: int) -> None: #One competing clitodo process
+    todoer = clitodo.Todoer(db_path, backend, fsync)
+    for number in range(count):
+        todoer.add([f"Worker {worker} to-do {number}"])
+
+def run(db_path: Path, backend: str, fsync: str, processes: int, count: int) -> float:
+    """Run the competing processes and return their wall time in seconds."""
+    workers = [
+        multiprocessing.Process(target=add_todos, args=(db_path, backend, fsync, count, worker))
+        for worker in range(processes)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", "-p", type=int, default=4, help="Number of competing processes.")
+    parser.add_argument("--ops", "-n", type=int, default=200, help="Adds per process.")
+    parser.add_argument("--fsync", default="file", choices=FSYNC_POLICIES, help="fsync policy.")
+    args = parser.parse_args()
+    print(f"{'backend':<10}{'ops/sec':>10}{'lost':>6}")
+    for backend in BACKENDS:
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = Path(directory) / "todo"
+            database.init_database(db_path, backend)
+            seconds = run(db_path, backend, args.fsync, args.processes, args.ops)
+            todos = database.get_database_handler(db_path, backend).read_todos().todo_list
+            lost = args.processes * args.ops - len({todo.id for todo in todos}) #Every add must survive with its own ID
+            print(f"{backend:<10}{args.processes * args.ops / seconds:>10.0f}{lost:>6}")
+
+if __name__ == "__main__":
+    main()
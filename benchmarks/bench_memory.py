@@ -0,0 +1,38 @@
+"""Compare the memory used by ToDo records and plain dictionaries."""
+# benchmarks/bench_memory.py
+
+import argparse
+import tracemalloc
+
+from clitodo.database import ToDo
+
+def measure(build, descriptions) -> int: #Return the bytes still allocated after building the records
+    tracemalloc.start()
+    records = build(descriptions) #Keep a reference so the records are counted
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size
+
+def build_dicts(descriptions):
+    return [
+        {"Description": text, "Priority": 2, "Done": False} for text in descriptions
+    ]
+
+def build_records(descriptions):
+    return [ToDo(text, 2, False) for text in descriptions]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", "-n", type=int, default=1_000_000, help="Number of to-dos to build.")
+    args = parser.parse_args()
+    descriptions = [f"To-do number {number}." for number in range(args.count)] #Shared by both runs, so only the records are measured
+    dict_bytes = measure(build_dicts, descriptions)
+    record_bytes = measure(build_records, descriptions)
+    print(f"{args.count:,} to-dos")
+    print(f"dict: {dict_bytes:>14,} bytes ({dict_bytes / args.count:.0f} per to-do)")
+    print(f"ToDo: {record_bytes:>14,} bytes ({record_bytes / args.count:.0f} per to-do)")
+    print(f"saved: {1 - record_bytes / dict_bytes:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Measure the wall time of short clitodo commands, startup included."""
+# benchmarks/bench_startup.py
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+def run(args, env) -> float: #Return the wall time of one interpreter run in seconds
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, *args],
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        input=b"",
+    )
+    return time.perf_counter() - start
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", "-r", type=int, default=20, help="Runs per command.")
+    parser.add_argument("--todos", "-n", type=int, default=100, help="Size of the listed database.")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as home: #A throwaway home keeps the user's config.ini untouched
+        env = dict(os.environ, HOME=home, XDG_CONFIG_HOME=str(Path(home) / ".config"))
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(Path(__file__).resolve().parents[1]), env.get("PYTHONPATH")]))
+        (Path(home) / ".config").mkdir()
+        subprocess.run(
+            [sys.executable, "-m", "clitodo", "init", "--db-path", str(Path(home) / "todo.json")],
+            env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        todos = "".join(f"To-do number {number}\n" for number in range(args.todos))
+        subprocess.run(
+            [sys.executable, "-m", "clitodo", "import", "-"],
+            env=env, check=True, stdout=subprocess.DEVNULL, input=todos.encode(),
+        )
+        commands = {
+            "python": ["-c", "pass"], #Interpreter startup alone, the floor for every command
+            "--version": ["-m", "clitodo", "--version"],
+            "list": ["-m", "clitodo", "list", "--no-pager"],
+        }
+        print(f"{'command':<12}{'min ms':>10}{'median ms':>12}")
+        for name, command in commands.items():
+            times = [run(command, env) for _ in range(args.runs)]
+            print(f"{name:<12}{min(times) * 1000:>10.1f}{statistics.median(times) * 1000:>12.1f}")
+
+if __name__ == "__main__":
+    main()
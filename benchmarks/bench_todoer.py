@@ -0,0 +1,148 @@
+"""Time Todoer operations on generated databases of growing size."""
+# benchmarks/bench_todoer.py
+
+import argparse
+import json
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from clitodo import BACKENDS, FSYNC_POLICIES, cli, clitodo, database
+
+OPERATIONS = ("add", "set_done", "remove", "remove_all", "get_todo_list", "list")
+RESET_RUNS = 3 #remove_all empties the database, so it is timed on a fresh copy only this many times
+
+def percentile(times: List[float], fraction: float) -> float: #Nearest-rank percentile of sorted times
+    return times[min(len(times) - 1, int(fraction * len(times)))]
+
+def bytes_written() -> Optional[int]: #Bytes this process passed to write() so far, None where the kernel doesn't say
+    try:
+        with open("/proc/self/io") as io:
+            for line in io:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def fill(db_path: Path, backend: str, size: int) -> None: #Write a database of size to-dos in one go
+    todos = (
+        database.ToDo(f"Benchmark to-do number {number}.", number % 3 + 1, number % 2 == 0)
+        for number in range(size)
+    )
+    database.init_database(db_path, backend)
+    database.get_database_handler(db_path, backend, "off").load_todos(todos)
+
+def measure(operation: Callable[[], Any], runs: int, setup: Callable[[], Any] = None) -> Dict[str, Any]:
+    """Run operation runs times and return its latency percentiles and bytes written per run."""
+    times = []
+    written = 0
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        before = bytes_written()
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+        after = bytes_written()
+        if before is not None:
+            written += after - before
+    times.sort()
+    return {
+        "runs": runs,
+        "p50_ms": percentile(times, 0.50) * 1000,
+        "p90_ms": percentile(times, 0.90) * 1000,
+        "p99_ms": percentile(times, 0.99) * 1000,
+        "max_ms": times[-1] * 1000,
+        "bytes_written": written // runs if bytes_written() is not None else None,
+    }
+
+def run_size(backend: str, size: int, runs: int, fsync: str) -> List[Dict[str, Any]]:
+    """Benchmark every operation on one database, in a process of its own so peak RSS is per size."""
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = Path(directory) / f"todo.{backend}"
+        fill(db_path, backend, size)
+        todoer = clitodo.Todoer(db_path, backend, fsync)
+        id_runs = min(runs, size // 2) #set_done and remove each need a to-do of their own per run
+        ids = random.Random(size).sample(range(1, size + 1), id_runs * 2)
+        done_ids, removed_ids = iter(ids[:id_runs]), iter(ids[id_runs:])
+        results = {
+            "add": measure(lambda: todoer.add(["Benchmark", "to-do"]), runs),
+            "set_done": measure(lambda: todoer.set_done(next(done_ids)), id_runs),
+            "remove": measure(lambda: todoer.remove(next(removed_ids)), id_runs),
+            "get_todo_list": measure(todoer.get_todo_list, runs),
+            "list": measure(lambda: "".join(cli._render_pages(todoer.iter_todos())), runs), #Rendering without the terminal write
+            "remove_all": measure(todoer.remove_all, min(runs, RESET_RUNS), lambda: fill(db_path, backend, size)),
+        }
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss #Kilobytes on Linux
+    return [
+        dict(backend=backend, size=size, operation=operation, peak_rss_kb=peak_rss_kb, **results[operation])
+        for operation in OPERATIONS
+    ]
+
+def compare(old_path: Path, new_path: Path, threshold: float, min_ms: float) -> int:
+    """Print the p50 change of every operation and return how many regressed past the threshold."""
+    old, new = (json.loads(Path(path).read_text()) for path in (old_path, new_path))
+    baseline = {(row["backend"], row["size"], row["operation"]): row for row in old["results"]}
+    regressions = 0
+    print(f"{'backend':<9}{'size':>9}  {'operation':<15}{'old ms':>10}{'new ms':>10}{'change':>9}")
+    for row in new["results"]:
+        before = baseline.get((row["backend"], row["size"], row["operation"]))
+        if before is None:
+            continue
+        change = row["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+        flag = ""
+        if change > threshold and row["p50_ms"] - before["p50_ms"] > min_ms: #Tiny absolute changes are timer noise
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{row['backend']:<9}{row['size']:>9}  {row['operation']:<15}"
+            f"{before['p50_ms']:>10.3f}{row['p50_ms']:>10.3f}{change:>+9.0%}{flag}"
+        )
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated database sizes, up to 1000000.")
+    parser.add_argument("--backend", "-b", action="append", choices=BACKENDS, help="Storage engine, repeat for several.")
+    parser.add_argument("--runs", "-r", type=int, default=20, help="Timed runs per operation.")
+    parser.add_argument("--fsync", default="off", choices=FSYNC_POLICIES, help="fsync policy used while timing.")
+    parser.add_argument("--output", "-o", type=Path, help="Write the JSON results here instead of standard output.")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("OLD", "NEW"), help="Compare two result files.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative p50 slowdown flagged as a regression.")
+    parser.add_argument("--min-ms", type=float, default=0.5, help="Ignore p50 slowdowns smaller than this.")
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold, args.min_ms) else 0)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if min(sizes) < 2 or args.runs < 1:
+        parser.error("sizes must be at least 2 and runs at least 1")
+    results = []
+    for backend in args.backend or ["json"]:
+        for size in sizes:
+            with ProcessPoolExecutor(max_workers=1) as pool: #A fresh process per size keeps peak RSS from carrying over
+                results += pool.submit(run_size, backend, size, args.runs, args.fsync).result()
+            print(f"{backend} {size}: done", file=sys.stderr)
+    report = json.dumps(
+        {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+            "fsync": args.fsync,
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        args.output.write_text(report + "\n")
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
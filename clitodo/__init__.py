@@ -5,6 +5,14 @@
 __app_name__ = "clitodo"
 __version__ = "0.1.0"
 
+DEFAULT_BACKEND = "json" #The storage engine used when config.ini doesn't name one
+BACKENDS = ("json", "journal", "sqlite", "records") #The storage engines users can select with the "backend" key
+DEFAULT_FSYNC = "file" #How hard writes are pushed to disk when config.ini doesn't say
+FSYNC_POLICIES = ("off", "file", "full") #off leaves it to the OS, file syncs the written file, full also syncs its directory
+DEFAULT_LIST = "default" #The name of the to-do list stored at the [General] database path
+LIST_SECTION = "list:" #config.ini section prefix of the named to-do lists, e.g. [list:work]
+REPEATS = ("day", "week", "month") #How often a recurring to-do comes back, its next due date is this much later
+
 (
      SUCCESS,
      DIR_ERROR,
@@ -13,7 +21,10 @@ __version__ = "0.1.0"
      DB_WRITE_ERROR,
      JSON_ERROR,
      ID_ERROR,
- ) = range(7) # A series of return and error codes
+     PRIORITY_ERROR,
+     DB_CONFLICT_ERROR,
+     DUE_ERROR,
+ ) = range(10) # A series of return and error codes
 
 
 ERRORS = {
@@ -22,4 +33,7 @@ ERRORS = {
      DB_READ_ERROR: "database read error",
      DB_WRITE_ERROR: "database write error",
      ID_ERROR: "to-do id error",
+     PRIORITY_ERROR: "to-do priority error",
+     DB_CONFLICT_ERROR: "database changed by another process",
+     DUE_ERROR: "to-do due date error",
  } #A dictionary that maps error codes to human-readable error messages
\ No newline at end of file
@@ -1,9 +1,16 @@
 """CLI To-Do entry point script"""
 # clitodo/__main__.py
 
-from clitodo import cli, __app_name__
+import sys
+
+from clitodo import timing #First, so the startup phase of --profile starts as early as possible
+from clitodo import __app_name__, __version__
 
 def main():
+    if sys.argv[1:] in (["--version"], ["-v"]): #Answer the version flag before importing Typer and the storage layers
+        print(f"{__app_name__} v{__version__}")
+        return
+    from clitodo import cli
     cli.app(prog_name=__app_name__) #Call the Typer app, passing the application's name to the prog_name argument,
                                     # ensure that the users get the correct app name when running the --help option on their command line
 
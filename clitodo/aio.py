@@ -0,0 +1,143 @@
+"""This module provides the CLI To-Do asyncio API."""
+# clitodo/aio.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from clitodo import DEFAULT_FSYNC
+from clitodo.clitodo import CurrentToDo, Todoer
+from clitodo.database import DEFAULT_BACKEND, ToDo
+
+Request = Tuple[str, tuple, "asyncio.Future[Any]"] #Todoer method name, its arguments and the caller's future
+
+class AsyncTodoer:
+    """Todoer for asyncio programs, with the database I/O done in a worker thread.
+
+    Calls are queued and applied in order. Mutations that queue up while a
+    write is in progress are applied together in one transaction, so a burst
+    of callers costs one read and one write instead of one of each per call.
+    """
+
+    def __init__(
+            self,
+            db_path: Path,
+            backend: str = DEFAULT_BACKEND,
+            fsync: str = DEFAULT_FSYNC,
+            max_batch: int = 256,
+    ) -> None:
+        self._todoer = Todoer(db_path, backend, fsync) #Only ever used from the worker thread, Todoer isn't thread-safe
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clitodo") #One thread keeps the calls in queue order
+        self._max_batch = max_batch #Most calls applied in one transaction
+        self._queue: Optional["asyncio.Queue[Optional[Request]]"] = None #Created in the running event loop by the first call
+        self._worker: Optional["asyncio.Task[None]"] = None
+        self._closed = False
+
+    async def __aenter__(self) -> "AsyncTodoer":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def add(
+            self, description: List[str], priority: int = 2, due: Optional[str] = None, repeat: Optional[str] = None
+    ) -> CurrentToDo:
+        """Add a new to-do to the database."""
+        return await self._submit("add", description, priority, due, repeat)
+
+    async def set_done(self, todo_id: int) -> CurrentToDo:
+        """Set a to-do as done using its ID."""
+        return await self._submit("set_done", todo_id)
+
+    async def remove(self, todo_id: int) -> CurrentToDo:
+        """Remove a to-do from the database using its ID."""
+        return await self._submit("remove", todo_id)
+
+    async def get_todo_list(self) -> List[ToDo]:
+        """Return the current to-do list, including every change queued before the call."""
+        return await self._submit("get_todo_list")
+
+    async def aclose(self) -> None:
+        """Apply the queued calls and stop the worker thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._worker is not None:
+            self._queue.put_nowait(None) #Tells the worker to stop once everything before it is applied
+            await self._worker
+        self._executor.shutdown(wait=True)
+
+    async def _submit(self, name: str, *args: Any) -> Any: #Queue a Todoer call and wait for its result
+        if self._closed:
+            raise RuntimeError("AsyncTodoer is closed")
+        loop = asyncio.get_running_loop()
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((name, args, future))
+        return await future
+
+    async def _run(self) -> None: #Take whatever queued up since the last batch and apply it in the worker thread
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            requests: List[Request] = []
+            request = await self._queue.get()
+            while True:
+                if request is None:
+                    closing = True
+                    break
+                requests.append(request)
+                if len(requests) == self._max_batch or self._queue.empty():
+                    break
+                request = self._queue.get_nowait()
+            if not requests:
+                continue
+            calls = [(name, args) for name, args, _ in requests]
+            try:
+                results = await loop.run_in_executor(self._executor, self._apply, calls)
+            except Exception as error: #Every caller in the batch sees the failure
+                for _, _, future in requests:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, _, future), result in zip(requests, results):
+                if future.done(): #The caller may have been cancelled, the call was still applied
+                    continue
+                if isinstance(result, Exception): #Raised by this caller's own call
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _apply(self, calls: List[Tuple[str, tuple]]) -> List[Any]: #Runs in the worker thread
+        results: List[Any] = []
+        start = 0
+        while start < len(calls): #Runs of mutations share a transaction, runs of reads share a read
+            reading = calls[start][0] == "get_todo_list"
+            end = start
+            while end < len(calls) and (calls[end][0] == "get_todo_list") == reading:
+                end += 1
+            if reading:
+                todo_list = self._todoer.get_todo_list()
+                results.extend(list(todo_list) for _ in range(start, end)) #Each caller gets a list of its own
+            else:
+                results.extend(self._write(calls[start:end]))
+            start = end
+        return results
+
+    def _write(self, calls: List[Tuple[str, tuple]]) -> List[Any]: #Apply mutations with one read and one write
+        results: List[Any] = []
+        with self._todoer.transaction() as transaction:
+            for name, args in calls:
+                try:
+                    results.append(getattr(self._todoer, name)(*args))
+                except Exception as error: #A bad request fails its own caller, not the whole batch's write
+                    results.append(error)
+        if transaction.error: #Nothing was written, so the calls that looked successful failed too
+            results = [
+                result if isinstance(result, Exception) else result._replace(error=result.error or transaction.error)
+                for result in results
+            ]
+        return results
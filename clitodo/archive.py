@@ -0,0 +1,46 @@
+"""This module provides the CLI To-Do archive of completed to-dos."""
+# clitodo/archive.py
+
+import gzip #This module compresses the archive segments with the standard library
+import json
+import os
+from pathlib import Path
+from typing import Iterator, List
+
+from clitodo.database import ToDo, _atomic_file
+
+class Archive: #Append-only, compressed segments of archived to-dos in a directory next to the database
+    PATTERN = "segment-*.ndjson.gz"
+
+    def __init__(self, db_path: Path) -> None:
+        self._directory = db_path.with_suffix(".archive") #Shared by every engine's file for the same list, so migrate keeps it
+
+    def segments(self) -> List[Path]: #Return the segment files, oldest first
+        return sorted(self._directory.glob(self.PATTERN))
+
+    def append(self, todos: List[ToDo], fsync: str) -> Path: #Write the to-dos into a new segment and return it, raises OSError
+        self._directory.mkdir(exist_ok=True)
+        segments = self.segments()
+        number = int(segments[-1].name.split("-")[1].split(".")[0]) + 1 if segments else 1
+        path = self._directory / f"segment-{number:06d}.ndjson.gz"
+        with _atomic_file(path, "wb", fsync) as file: #Segments appear whole or not at all and are never changed afterwards
+            with gzip.GzipFile(fileobj=file, mode="wb", mtime=0) as segment:
+                segment.write("".join(json.dumps(todo.to_dict()) + "\n" for todo in todos).encode())
+        return path
+
+    def drop(self, path: Path) -> None: #Delete a segment whose to-dos never left the database
+        path.unlink(missing_ok=True)
+
+    def move_to(self, db_path: Path) -> None: #Follow the database to a new location
+        target = Archive(db_path)._directory
+        if self._directory.exists() and self._directory != target and not target.exists():
+            os.replace(self._directory, target)
+
+    def iter_todos(self) -> Iterator[ToDo]: #Decompress one segment at a time, raises OSError or ValueError on damaged segments
+        for path in self.segments():
+            try:
+                with gzip.open(path, "rt") as segment:
+                    for line in segment:
+                        yield ToDo.from_dict(json.loads(line))
+            except EOFError as error: #A truncated gzip stream
+                raise ValueError(f"truncated archive segment {path}") from error
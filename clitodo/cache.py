@@ -0,0 +1,70 @@
+"""This module provides the CLI To-Do parse cache."""
+# clitodo/cache.py
+
+import marshal #This module provides the fastest serialization of plain Python values in the standard library
+import os
+import struct
+from pathlib import Path #This class provides a cross-platform way to handle system paths
+from typing import Any, NamedTuple, Optional, Tuple
+
+CACHE_VERSION = 5 #Bump whenever the cached values change shape, older caches are then ignored
+COUNTERS = struct.Struct("<QQ") #Hits and misses, rewritten in place so the stats file never grows
+
+def file_key(stat: os.stat_result) -> Tuple[int, int, int]: #Identify a version of a file by its mtime, size and inode
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+class CacheStats(NamedTuple):
+    hits: int #Number of loads answered by the cache
+    misses: int #Number of loads that had to parse the source file
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class ParseCache: #Sidecar snapshot of a parsed file, valid while the file's key is unchanged
+    def __init__(self, source: Path) -> None:
+        self._path = source.with_name(source.name + ".cache")
+        self._stats_path = source.with_name(source.name + ".cache.stats")
+
+    def load(self, key: Tuple[int, int, int]) -> Optional[Any]: #Return the cached value for this version of the source, or None
+        try:
+            version, cached_key, value = marshal.loads(self._path.read_bytes()) #One read, marshal.load on a file object reads in small pieces
+        except (OSError, EOFError, ValueError, TypeError): #Missing or damaged caches are just misses
+            value = None
+        else:
+            if version != CACHE_VERSION or tuple(cached_key) != key: #The source was edited since the cache was written
+                value = None
+        self._count(value is not None)
+        return value
+
+    def store(self, key: Tuple[int, int, int], value: Any) -> None: #Save the parsed value, the cache is best effort so errors are ignored
+        temp_path = self._path.with_name(self._path.name + ".tmp")
+        try:
+            temp_path.write_bytes(marshal.dumps((CACHE_VERSION, key, value)))
+            os.replace(temp_path, self._path) #Readers never see a half-written cache
+        except (OSError, ValueError):
+            pass
+
+    def clear(self) -> None: #Delete the cache and its counters
+        self._path.unlink(missing_ok=True)
+        self._stats_path.unlink(missing_ok=True)
+
+    def stats(self) -> CacheStats: #Return the hits and misses counted so far
+        try:
+            return CacheStats(*COUNTERS.unpack(self._stats_path.read_bytes()[:COUNTERS.size]))
+        except (OSError, struct.error): #No counters yet, or a file from an older version
+            return CacheStats(0, 0)
+
+    def _count(self, hit: bool) -> None: #Add one load to the fixed-size counters, counting is best effort so errors are ignored
+        try:
+            with self._stats_path.open("a+b") as stats: #Creates the file without truncating it
+                stats.seek(0)
+                try:
+                    hits, misses = COUNTERS.unpack(stats.read(COUNTERS.size))
+                except struct.error:
+                    hits = misses = 0
+                stats.truncate(0)
+                stats.write(COUNTERS.pack(hits + hit, misses + (not hit)))
+        except OSError:
+            pass
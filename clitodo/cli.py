@@ -1,56 +1,102 @@
 """This module provides the CLI To-Do List"""
 # clitodo/cli.py
 
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import chain
 from pathlib import Path
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Mapping, Optional, TextIO, Tuple
 
 import typer
 
 from clitodo import (
-    ERRORS, __app_name__, __version__, config, database, clitodo
-)
+    BACKENDS, DB_READ_ERROR, DB_WRITE_ERROR, DEFAULT_BACKEND, DEFAULT_FSYNC, DEFAULT_LIST, ERRORS, FSYNC_POLICIES, ID_ERROR,
+    REPEATS, __app_name__, __version__, timing
+) #The config, database and model modules are imported by the commands that need them,
+  # so commands like --version don't pay for the storage layers at startup
+
+if TYPE_CHECKING:
+    from clitodo.clitodo import Todoer
+    from clitodo.database import DatabaseSettings
 
 app = typer.Typer() #Create an explicit Typer application
+_session_todoer: Optional["Todoer"] = None #The Todoer kept warm by the shell and serve commands
+SESSION_BLOCKED = ("init", "migrate", "shell", "serve", "archive") #Commands that would replace the database under a running session,
+                                                                 #or write archive segments a failed session flush couldn't take back
+_list_name = DEFAULT_LIST #The to-do list selected with --list
+MAX_RANGE = 10000 #Longest range complete and remove accept, so a typo like 1-1000000000 doesn't build a billion IDs
+
+def _default_db_path() -> str: #Computed only when init needs it, which keeps the database module out of startup
+    from clitodo import database
+    return str(database.DEFAULT_DB_FILE_PATH)
 
 @app.command() #Define init() as a Typer command using the @app.command()
 def init( #Define a Typer Option instance and assign it as a default value to db_path
         db_path: str = typer.Option(
-            str(database.DEFAULT_DB_FILE_PATH),
+            _default_db_path, #Click calls the function when the default is needed
             "--db-path",
             "-db",
+            help="Database location, defaults to ~/.<user>_todo.json.",
             prompt="to-do database location?" #Displays a prompt asking for the database location,
                                               # also allows the user to accept the default path by pressing Enter
-        )
+        ),
+        backend: str = typer.Option(
+            DEFAULT_BACKEND,
+            "--backend",
+            "-b",
+            help=f"Storage engine: {', '.join(BACKENDS)}.",
+        ), #Define backend as an option to select the storage engine
+        fsync: str = typer.Option(
+            DEFAULT_FSYNC,
+            "--fsync",
+            help=f"When writes are synced to disk: {', '.join(FSYNC_POLICIES)}.",
+        ),
 )-> None:
     """Initialize the to-do database."""
-    app_init_error = config.init_app(db_path) #Create the application's configuration file and to-do database
-    if app_init_error: #Check if the call to init_app() returns an error
+    from clitodo import config, database
+    if backend not in BACKENDS: #Reject unknown storage engines before touching the config file
+        typer.secho(f'Unknown backend "{backend}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    if fsync not in FSYNC_POLICIES:
+        typer.secho(f'Unknown fsync policy "{fsync}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    db_init_error = database.init_database(Path(db_path), backend) #Initialize the database with an empty to-do list,
+                                                                    #first, so a failure leaves the config file pointing at the old database
+    if db_init_error: #Check if the call to init_database() returns an error
         typer.secho(
-            f'Creating config file failed with "{ERRORS[app_init_error]}"',
+            f'Creating database failed with "{ERRORS[db_init_error]}"',
             fg=typer.colors.RED,
         )
+        if Path(db_path).exists(): #Most likely a database in another format, which init can't convert
+            typer.secho(f'Use "{__app_name__} migrate" to move an existing database to another backend', fg=typer.colors.RED)
         raise typer.Exit(1)
-    db_init_error = database.init_database(Path(db_path)) #Initialize the database with an empty to-do list
-    if db_init_error: #Check if the call to init_database() returns an error
+    app_init_error = config.init_app(db_path, backend, fsync) #Create the application's configuration file
+    if app_init_error: #Check if the call to init_app() returns an error
         typer.secho(
-            f'Creating database failed with "{ERRORS[db_init_error]}"',
+            f'Creating config file failed with "{ERRORS[app_init_error]}"',
             fg=typer.colors.RED,
         )
         raise typer.Exit(1)
     else:
         typer.secho(f"The to-do database is {db_path}", fg=typer.colors.GREEN)
 
-def get_todoer() -> clitodo.Todoer:
-    if config.CONFIG_FILE_PATH.exists(): # Define a conditional that checks if the application's configuration file exist
-        db_path = database.get_database_path(config.CONFIG_FILE_PATH)
-    else:
+def get_todoer() -> "Todoer":
+    if _session_todoer is not None: #Commands run from the shell or the server reuse its in-memory to-do list
+        return _session_todoer
+    from clitodo.clitodo import Todoer
+    db_path, backend, fsync, auto_archive = _get_list_settings()
+    if backend not in BACKENDS: #Check that config.ini names a known storage engine
         typer.secho(
-            'Confid file not found. Please, run "clitodo init"',
+            f'Unknown backend "{backend}" in config file. Please, run "clitodo init"',
             fg=typer.colors.RED,
         )
         raise typer.Exit(1)
     if db_path.exists(): #Check if the path to the database exists
-        return clitodo.Todoer(db_path)
+        return Todoer(db_path, backend, fsync, auto_archive)
     else:
         typer.secho(
             'Database not found. Please, run "clitodo init"',
@@ -58,15 +104,60 @@ def get_todoer() -> clitodo.Todoer:
         )
         raise typer.Exit(1)
 
+def _get_list_settings() -> "DatabaseSettings": #Return the selected list's settings, creating its shard on first use
+    from clitodo import config, database
+    if config.CONFIG_FILE_PATH.exists(): # Define a conditional that checks if the application's configuration file exist
+        lists = database.get_list_settings(config.CONFIG_FILE_PATH) #Served from config.ini.cache unless config.ini changed
+    else:
+        typer.secho(
+            'Confid file not found. Please, run "clitodo init"',
+            fg=typer.colors.RED,
+        )
+        raise typer.Exit(1)
+    if _list_name in lists:
+        return lists[_list_name]
+    default = lists[DEFAULT_LIST]
+    shard_path = default.path.with_name(f"{default.path.stem}.{_list_name}{default.path.suffix}") #Next to the default list, in the same engine
+    error = database.init_database(shard_path, default.backend)
+    if not error:
+        error = config.register_list(_list_name, str(shard_path), default.backend)
+    if error:
+        typer.secho(f'Creating list "{_list_name}" failed with "{ERRORS[error]}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    typer.secho(f'Created the to-do list "{_list_name}" in {shard_path}', fg=typer.colors.GREEN, err=True)
+    return default._replace(path=shard_path)
+
+def _parse_days(spec: str) -> int: #Turn a span like 3d or 2w into a number of days
+    unit = spec[-1:].lower()
+    if unit not in ("d", "w") or not spec[:-1].isdigit():
+        raise typer.BadParameter(f"{spec} is not a span like 3d or 2w")
+    return int(spec[:-1]) * (7 if unit == "w" else 1)
+
+def _parse_due(spec: str) -> str: #Turn an ISO date, today, tomorrow or a span from today into an ISO date
+    if spec.lower() in ("today", "tomorrow"):
+        return (date.today() + timedelta(days=spec.lower() == "tomorrow")).isoformat()
+    if spec[:1].isdigit() and spec[-1:].lower() in ("d", "w"):
+        return (date.today() + timedelta(days=_parse_days(spec))).isoformat()
+    return spec #The model checks ISO dates and reports bad ones as due date errors
+
 @app.command()  # Define add() as a Typer command using the @app.command()
 def add(
         description: List[str] = typer.Argument(...), #Define description as an argument to add(),
                                                       #user must provide a to-do description at the command line
         priority: int = typer.Option(2, "--priority", "-p", min=1, max=3),
+        due: Optional[str] = typer.Option(
+            None, "--due", "-d", help="Due date: YYYY-MM-DD, today, tomorrow or a span like 3d or 2w."
+        ),
+        every: Optional[str] = typer.Option(
+            None, "--every", help=f"Repeat after completion, every {', '.join(REPEATS)}. Needs --due."
+        ),
 ) -> None:
     """Add a new to-do with a DESCRIPTION."""
+    if every is not None and every not in REPEATS:
+        raise typer.BadParameter(f"--every must be one of {', '.join(REPEATS)}")
+    due = _parse_due(due) if due is not None else None
     todoer = get_todoer()
-    todo, error = todoer.add(description, priority)
+    todo, error = todoer.add(description, priority, due, every)
     if error: #A conditional statement that prints an error message and exits the application if an error occurs while adding the new to-do to the database
         typer.secho(
             f'Adding to-do failed with "{ERRORS[error]}"', fg=typer.colors.RED
@@ -74,65 +165,362 @@ def add(
         raise typer.Exit(1)
     else:
         typer.secho(
-            f"""to-do: "{todo['Description']}" was added"""
-            f""" with priority: {priority}""",
+            f"""to-do # {todo['ID']}: "{todo['Description']}" was added"""
+            f""" with priority: {priority}"""
+            + (f", due: {todo['Due']}" if due is not None else "")
+            + (f", every {every}" if every is not None else ""),
             fg=typer.colors.GREEN,
         )
 
+IMPORT_FORMATS = ("ndjson", "csv", "lines") #The input formats accepted by the import command
+
+def _read_import(
+        source: TextIO, import_format: str, priority: int
+) -> Iterator[Tuple[List[str], int]]: #Yield (description, priority) pairs one line at a time, raises ValueError on malformed lines
+    if import_format == "csv": #CSV files need a header with a Description and an optional Priority column
+        import csv
+        rows = csv.DictReader(source)
+    elif import_format == "ndjson": #One JSON object per line with the same keys as the database
+        rows = (json.loads(line) for line in source if line.strip())
+    else: #One description per line, every to-do gets the --priority value
+        rows = ({"Description": line.strip()} for line in source if line.strip())
+    for number, row in enumerate(rows, 1):
+        try:
+            description, value = row["Description"], row.get("Priority")
+            if not isinstance(description, str): #null or a number would only fail later, inside add_many
+                raise TypeError(description)
+            item_priority = priority if value in (None, "") else int(value) #An explicit 0 is kept, so add_many rejects it
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError(f"item {number} needs a Description and a numeric Priority")
+        yield [description], item_priority
+
+@app.command(name="import") #Define import_todos() as a Typer command, import is a Python keyword so the name is set here
+def import_todos(
+        source: typer.FileText = typer.Argument(
+            "-", help="File to import, - reads from standard input."
+        ),
+        import_format: Optional[str] = typer.Option(
+            None,
+            "--format",
+            "-f",
+            help=f"Input format: {', '.join(IMPORT_FORMATS)}. Guessed from the file suffix by default.",
+        ),
+        priority: int = typer.Option(2, "--priority", "-p", min=1, max=3, help="Priority for items that don't set one."),
+) -> None:
+    """Add every to-do from a NDJSON, CSV or plain text file in one write."""
+    if import_format is None: #Guess the format from the file name
+        suffix = Path(source.name).suffix.lower()
+        import_format = {".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}.get(suffix, "lines")
+    if import_format not in IMPORT_FORMATS:
+        typer.secho(f'Unknown format "{import_format}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    todoer = get_todoer()
+    start = time.perf_counter()
+    try:
+        todo_list, error = todoer.add_many(_read_import(source, import_format, priority))
+    except ValueError as err: #Malformed input, nothing was written
+        typer.secho(f"Importing to-dos failed: {err}", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    elapsed = time.perf_counter() - start
+    if error:
+        typer.secho(
+            f'Importing to-do # {len(todo_list) + 1} failed with "{ERRORS[error]}"',
+            fg=typer.colors.RED,
+        )
+        raise typer.Exit(1)
+    else:
+        typer.secho(
+            f"{len(todo_list)} to-dos were imported in {elapsed:.2f}s"
+            f" ({len(todo_list) / max(elapsed, 1e-9):,.0f} to-dos/s)",
+            fg=typer.colors.GREEN,
+        )
+
+@app.command() #Define export() as a Typer command using the @app.command() decorator
+def export(
+        output: Optional[Path] = typer.Option(
+            None, "--output", "-o", help="Write to this file instead of standard output."
+        ),
+        export_format: Optional[str] = typer.Option(
+            None,
+            "--format",
+            "-f",
+            help="Output format: ndjson, csv, json. Guessed from the output suffix by default.",
+        ),
+        priority: Optional[int] = typer.Option(
+            None, "--priority", "-p", min=1, max=3, help="Only export to-dos with this priority."
+        ),
+        done: Optional[bool] = typer.Option(
+            None, "--done/--pending", help="Only export done or pending to-dos."
+        ),
+) -> None:
+    """Write the to-dos as NDJSON, CSV or JSON, streamed in chunks so memory stays flat."""
+    from clitodo.export import EXPORT_FORMATS, export_todos
+    if export_format is None: #Guess the format from the file name
+        suffix = output.suffix.lower() if output else ""
+        export_format = {".csv": "csv", ".json": "json"}.get(suffix, "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        typer.secho(f'Unknown format "{export_format}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    todoer = get_todoer()
+    todos = todoer.stream_todos(priority, done) #Never the whole list, unlike get_todo_list()
+    try:
+        with timing.phase("output"):
+            if output is None:
+                count = export_todos(todos, sys.stdout, export_format)
+            else:
+                with output.open("w", newline="") as out: #The csv module writes its own line endings
+                    count = export_todos(todos, out, export_format)
+    except (OSError, ValueError) as err: #Unreadable database or unwritable output
+        typer.secho(f"Exporting to-dos failed: {err}", fg=typer.colors.RED, err=True)
+        raise typer.Exit(1)
+    if output is not None:
+        typer.secho(f"{count} to-dos were exported to {output}", fg=typer.colors.GREEN)
+
+PAGE_SIZE = 100 #Number of rows formatted into a single terminal write
+COLUMNS = (
+    "ID.  ",
+    "| Priority  ",
+    "| Done  ",
+    "| Due         ",
+    "| Description  ",
+) #The columns used to display the to-do list in a tabular format
+
+def _format_row(todo: Mapping[str, Any]) -> str: #Format a single to-do on its own row with appropriate padding and separators
+    id, priority, done = todo["ID"], todo["Priority"], todo["Done"]
+    due = todo.get("Due") or "" #Blank for to-dos without a due date
+    return (
+        f"{id}{(len(COLUMNS[0]) - len(str(id))) * ' '}"
+        f"| ({priority}){(len(COLUMNS[1]) - len(str(priority)) - 4) * ' '}"
+        f"| {done}{(len(COLUMNS[2]) - len(str(done)) -2) * ' '}"
+        f"| {due}{(len(COLUMNS[3]) - len(due) - 2) * ' '}"
+        f"| {todo['Description']}"
+    )
+
+def _render_pages(todos: Iterator[Mapping[str, Any]], title: str = "to-do list") -> Iterator[str]: #Yield the table one styled page of rows at a time
+    headers = "".join(COLUMNS)
+    yield (
+        typer.style(f"\n{title}:\n\n" + headers + "\n", fg=typer.colors.BLUE, bold=True)
+        + typer.style("-" * len(headers) + "\n", fg=typer.colors.BLUE)
+    ) #Prints a top-level header to present the to-do list
+    rows = []
+    try:
+        for todo in todos:
+            rows.append(_format_row(todo))
+            if len(rows) == PAGE_SIZE:
+                yield typer.style("\n".join(rows) + "\n", fg=typer.colors.BLUE)
+                rows = []
+    except (OSError, ValueError): #The database went bad while it was being read
+        rows.append(typer.style(f'Reading to-dos failed with "{ERRORS[DB_READ_ERROR]}"', fg=typer.colors.RED))
+    rows.append("-" * len(headers) + "\n") #A line of dashes visually separates the to-do list from the next command-line prompt
+    yield typer.style("\n".join(rows) + "\n", fg=typer.colors.BLUE)
+
+def _write_pages(pages: Iterator[str], pager: bool) -> None: #Print the table, through the system pager for long interactive listings
+    with timing.phase("output"):
+        if pager and sys.stdout.isatty():
+            typer.echo_via_pager(_count_output(pages))
+        else:
+            for page in _count_output(pages): #One write per page instead of one per row
+                typer.echo(page, nl=False)
+
+def _count_output(pages: Iterator[str]) -> Iterator[str]: #Add every page's length to the output phase
+    for page in pages:
+        timing.record("output", size=len(page))
+        yield page
+
 @app.command(name="list") #Define list_all() as a Typer command using the @app.command(),
                           #The name argument to this decorator sets a custom name for the command, which is list here
-                          #Doesn't take any argument or option, just lists the to-dos when user runs list from the command line
-def list_all() -> None:
+def list_all(
+        limit: Optional[int] = typer.Option(
+            None, "--limit", "-l", min=1, help="Show at most this many to-dos."
+        ),
+        offset: int = typer.Option(
+            0, "--offset", "-o", min=0, help="Skip this many to-dos first."
+        ),
+        pager: bool = typer.Option(
+            True, "--pager/--no-pager", help="Page long lists when writing to a terminal."
+        ),
+        priority: Optional[int] = typer.Option(
+            None, "--priority", "-p", min=1, max=3, help="Only show to-dos with this priority."
+        ),
+        done: Optional[bool] = typer.Option(
+            None, "--done/--pending", help="Only show done or pending to-dos."
+        ),
+        sort: str = typer.Option("id", "--sort", "-s", help="Sort by id or priority."),
+        reverse: bool = typer.Option(False, "--reverse", "-r", help="Reverse the sort order."),
+        all_lists: bool = typer.Option(
+            False, "--all-lists", "-a", help="Show every named list, read in parallel."
+        ),
+        include_archived: bool = typer.Option(
+            False, "--include-archived", help="Also show archived to-dos, after the active ones."
+        ),
+) -> None:
     """List all to-dos."""
+    if all_lists:
+        _list_lists(priority, done, sort, reverse, offset, limit, pager)
+        return
     todoer = get_todoer()
-    todo_list = todoer.get_todo_list() #Gets the to-do list from the database
-    if len(todo_list) == 0: #A conditional statement to check if there’s at least one to-do in the list
+    if priority is not None or done is not None or sort != "id" or reverse: #Filtered and sorted listings go through the indexes
+        from clitodo.search import SORT_KEYS
+        if sort not in SORT_KEYS:
+            raise typer.BadParameter(f"sort by {' or '.join(SORT_KEYS)}", param_hint="'--sort'")
+        todo_list, error = todoer.query(priority, done, sort, reverse, offset, limit)
+        if error:
+            typer.secho(f'Reading to-dos failed with "{ERRORS[error]}"', fg=typer.colors.RED)
+            raise typer.Exit(1)
+        todos = iter(todo_list)
+    else:
+        todos = todoer.iter_todos(offset, limit) #The database is decoded lazily, one to-do at a time
+    try:
+        first = next(todos, None) #Only the first to-do is needed to know whether the list is empty
+    except (OSError, ValueError):
         typer.secho(
-            "There are no tasks in the to-do list yet", fg=typer.colors.RED
+            f'Reading to-dos failed with "{ERRORS[DB_READ_ERROR]}"', fg=typer.colors.RED
         )
-        raise typer.Exit()
-    typer.secho("\nto-do list:\n", fg=typer.colors.BLUE, bold=True) #Prints a top-level header to present the to-do list
-    """Define and print the required columns to display the to-do list in a tabular format"""
-    columns = (
-        "ID.  ",
-        "| Priority  ",
-        "| Done  ",
-        "| Description  ",
-    )
-    headers = "".join(columns)
-    typer.secho(headers, fg=typer.colors.BLUE, bold=True)
-    typer.secho("-" * len(headers), fg=typer.colors.BLUE)
-    for id, todo in enumerate(todo_list, 1): #Print every single to-do on its own row with appropriate padding and separators
-        desc, priority, done = todo.values()
+        raise typer.Exit(1)
+    pages = [] if first is None else [_render_pages(chain([first], todos))]
+    if include_archived: #Segments are decompressed as the table is printed
+        archived = todoer.iter_archived(priority, done)
+        try:
+            first = next(archived, None)
+        except (OSError, ValueError):
+            typer.secho(f'Reading archived to-dos failed with "{ERRORS[DB_READ_ERROR]}"', fg=typer.colors.RED)
+            raise typer.Exit(1)
+        if first is not None:
+            pages.append(_render_pages(chain([first], archived), "archived to-do list"))
+    if not pages: #A conditional statement to check if there’s at least one to-do in the list
         typer.secho(
-            f"{id}{(len(columns[0]) - len(str(id))) * ' '}"
-            f"| ({priority}){(len(columns[1]) - len(str(priority)) - 4) * ' '}"
-            f"| {done}{(len(columns[2]) - len(str(done)) -2) * ' '}"
-            f"| {desc}",
-            fg=typer.colors.BLUE
+            "There are no tasks in the to-do list yet", fg=typer.colors.RED
         )
-    typer.secho("-" * len(headers) + "\n", fg=typer.colors.BLUE) #Prints a line of dashes  to visually separate the to-do list from the next command-line prompt
+        raise typer.Exit()
+    _write_pages(chain.from_iterable(pages), pager and limit is None)
+
+def _list_lists(
+        priority: Optional[int], done: Optional[bool], sort: str, reverse: bool,
+        offset: int, limit: Optional[int], pager: bool,
+) -> None: #Print every named list as a table of its own, offset and limit apply to each list
+    from clitodo import config, database
+    from clitodo.clitodo import query_lists
+    from clitodo.search import SORT_KEYS
+    if sort not in SORT_KEYS:
+        raise typer.BadParameter(f"sort by {' or '.join(SORT_KEYS)}", param_hint="'--sort'")
+    if not config.CONFIG_FILE_PATH.exists():
+        typer.secho('Config file not found. Please, run "clitodo init"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    lists = database.get_list_settings(config.CONFIG_FILE_PATH)
+    stop = None if limit is None else offset + limit
+    pages: List[Iterator[str]] = []
+    for name, (todo_list, error) in query_lists(lists, priority, done, sort, reverse):
+        if error:
+            typer.secho(f'Reading list "{name}" failed with "{ERRORS[error]}"', fg=typer.colors.RED)
+            raise typer.Exit(1)
+        todo_list = todo_list[offset:stop]
+        if todo_list: #Empty lists are left out
+            pages.append(_render_pages(iter(todo_list), f"{name} to-do list"))
+    if not pages:
+        typer.secho("There are no tasks in the to-do lists yet", fg=typer.colors.RED)
+        raise typer.Exit()
+    _write_pages(chain.from_iterable(pages), pager and limit is None)
+
+@app.command() #Define lists() as a Typer command using the @app.command() decorator
+def lists() -> None:
+    """Show the named to-do lists and their shard files."""
+    from clitodo import config, database
+    if not config.CONFIG_FILE_PATH.exists():
+        typer.secho('Config file not found. Please, run "clitodo init"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    for name, (db_path, backend, *_) in database.get_list_settings(config.CONFIG_FILE_PATH).items():
+        marker = "*" if name == _list_name else " " #The list commands use right now
+        typer.echo(f"{marker} {name:<16}{backend:<9}{db_path}")
+
+@app.command() #Define search() as a Typer command using the @app.command() decorator
+def search(
+        terms: List[str] = typer.Argument(..., help="Words to look for, each also matches longer words it starts."),
+        limit: int = typer.Option(20, "--limit", "-l", min=1, help="Show at most this many to-dos."),
+) -> None:
+    """Find to-dos whose descriptions contain every term, best matches first."""
+    todoer = get_todoer()
+    todo_list, error = todoer.search(terms, limit)
+    if error:
+        typer.secho(f'Searching to-dos failed with "{ERRORS[error]}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    if not todo_list:
+        typer.secho("No to-dos match the search", fg=typer.colors.RED)
+        raise typer.Exit()
+    _write_pages(_render_pages(iter(todo_list)), False)
+
+@app.command() #Define due() as a Typer command using the @app.command() decorator
+def due(
+        within: str = typer.Option("7d", "--within", "-w", help="How far ahead to look, like 3d or 2w."),
+        limit: Optional[int] = typer.Option(None, "--limit", "-l", min=1, help="Show at most this many to-dos."),
+) -> None:
+    """List the pending to-dos due soon, overdue ones included, soonest first."""
+    days = _parse_days(within)
+    todoer = get_todoer()
+    todo_list, error = todoer.due(days, limit=limit)
+    if error:
+        typer.secho(f'Reading due to-dos failed with "{ERRORS[error]}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    if not todo_list:
+        typer.secho(f"No to-dos are due within {within}", fg=typer.colors.GREEN)
+        raise typer.Exit()
+    _write_pages(_render_pages(iter(todo_list), "due to-dos"), False)
+
+def _parse_ids(specs: List[str]) -> List[Tuple[int, bool]]: #Expand IDs and ranges like 7-20 into unique (ID, in a range) pairs,
+                                                           #missing IDs inside a range are skipped, missing single IDs are errors
+    todo_ids: Dict[int, bool] = {}
+    for spec in specs:
+        first, _, last = spec.partition("-")
+        try:
+            start, stop = int(first), int(last or first)
+        except ValueError:
+            raise typer.BadParameter(f'"{spec}" is not an ID or a range like 7-20')
+        if start > stop:
+            raise typer.BadParameter(f'"{spec}" is an empty range')
+        if stop - start >= MAX_RANGE:
+            raise typer.BadParameter(f'"{spec}" is longer than {MAX_RANGE} IDs')
+        in_range = bool(last)
+        for todo_id in range(start, stop + 1):
+            todo_ids[todo_id] = todo_ids.get(todo_id, True) and in_range #Drop repeated IDs but keep their order, a single ID stays required
+    return list(todo_ids.items())
 
 @app.command(name="complete") #Define set_done() as a Typer command with the @app.command() decorator
-def set_done(todo_id:  int = typer.Argument(...)) -> None:
-    """Complete a to-do by setting it as done using its TODO_ID"""
+def set_done(
+        todo_ids: List[str] = typer.Argument(
+            ..., metavar="TODO_IDS...", callback=_parse_ids, help="IDs or ranges like 7-20, gaps in ranges are skipped."
+        ), #Typer converts the values with _parse_ids before set_done() runs
+) -> None:
+    """Complete to-dos by setting them as done using their TODO_IDS"""
     todoer = get_todoer()
-    todo, error = todoer.set_done(todo_id) #Sets the to-do with the specific todo_id as done
-    if error: #Checks if any error occurs during the process
+    messages = []
+    with todoer.transaction() as transaction: #All the to-dos are completed with one read and one write
+        for todo_id, in_range in todo_ids:
+            todo, error = todoer.set_done(todo_id) #Sets the to-do with the specific todo_id as done
+            if error == ID_ERROR and in_range: #Removed to-dos leave gaps in ranges
+                continue
+            if error: #Checks if any error occurs during the process, leaving the with block discards the batch
+                typer.secho(
+                    f'Completing to-do # "{todo_id}" failed with "{ERRORS[error]}"',
+                    fg=typer.colors.RED,
+                )
+                raise typer.Exit(1)
+            messages.append(f"""to-do # {todo_id} "{todo['Description']}" completed!""")
+        if not messages:
+            typer.secho("No to-dos in the given ranges", fg=typer.colors.RED)
+            raise typer.Exit(1)
+    if transaction.error:
         typer.secho(
-            f'Completing to-do # "{todo_id}" failed with "{ERRORS[error]}"',
+            f'Completing to-dos failed with "{ERRORS[transaction.error]}"',
             fg=typer.colors.RED,
         )
         raise typer.Exit(1)
     else:
-        typer.secho(
-            f"""to-do # {todo_id} "{todo['Description']}" completed!""",
-            fg=typer.colors.GREEN,
-        )
+        typer.secho("\n".join(messages), fg=typer.colors.GREEN)
 
 @app.command() #Define remove() asa Typer CLI command
 def remove(
-        todo_id: int = typer.Argument(...),
+        todo_ids: List[str] = typer.Argument(
+            ..., metavar="TODO_IDS...", callback=_parse_ids, help="IDs or ranges like 7-20, gaps in ranges are skipped."
+        ),
         force: bool = typer.Option(
             False,
             "--force",
@@ -141,36 +529,56 @@ def remove(
         ), #Defines force as an option for the remove command
            #Allows user to delete a to-do without confirmation
 ) -> None:
-    """Remove a to-do using its TODO_ID."""
+    """Remove to-dos using their TODO_IDS."""
     todoer = get_todoer()
 
     def _remove(): #Define an inner function
-                   #Helper function that allows you to reuse the remove functionality
-        todo ,error = todoer.remove(todo_id)
-        if error:
+                   #Helper function that removes the whole batch with one read and one write
+        messages = []
+        with todoer.transaction() as transaction:
+            for todo_id, in_range in todo_ids:
+                todo, error = todoer.remove(todo_id)
+                if error == ID_ERROR and in_range:
+                    continue
+                if error: #Leaving the with block with an exception discards the batch
+                    typer.secho(
+                        f'Removing to-do # {todo_id} failed with "{ERRORS[error]}"',
+                        fg=typer.colors.RED,
+                    )
+                    raise typer.Exit(1)
+                messages.append(f"""to-do # {todo_id}: '{todo["Description"]}' was removed""")
+            if not messages:
+                typer.secho("No to-dos in the given ranges", fg=typer.colors.RED)
+                raise typer.Exit(1)
+        if transaction.error:
             typer.secho(
-                f'Removing to-do # {todo_id} failed with "{ERRORS[error]}"',
+                f'Removing to-dos failed with "{ERRORS[transaction.error]}"',
                 fg=typer.colors.RED,
             )
             raise typer.Exit(1)
         else:
-            typer.secho(
-                f"""to-do # {todo_id}: '{todo["Description"]}' was removed""",
-                fg=typer.colors.GREEN,
-            )
+            typer.secho("\n".join(messages), fg=typer.colors.GREEN)
     if force: #Checks the value of force.
-              #If True, the user wants to remove the to-do without confirmation
+              #If True, the user wants to remove the to-dos without confirmation
         _remove()
     else:
-        todo_list =todoer.get_todo_list() #Get the entire to-do list from the database
-        try: #Retrieves the desired to-do from the list
-            todo = todo_list[todo_id - 1]
-        except IndexError:
+        with todoer.transaction(): #Look up every to-do with a single read
+            found = [(todoer.get_todo(todo_id), in_range) for todo_id, in_range in todo_ids]
+        if any(error and not (error == ID_ERROR and in_range) for (_, error), in_range in found):
             typer.secho("Invalid TODO_ID", fg=typer.colors.RED)
             raise typer.Exit(1)
-        delete = typer.confirm(
-            f"Delete to-do # {todo_id}: {todo['Description']}?"
-        ) #Call Typer’s confirm() and store the result in delete.
+        found = [todo for todo, _ in found if not todo.error]
+        if not found:
+            typer.secho("No to-dos in the given ranges", fg=typer.colors.RED)
+            raise typer.Exit(1)
+        todo_ids = [(todo.todo["ID"], False) for todo in found] #Only the to-dos just confirmed are removed
+        if len(found) == 1:
+            question = f"Delete to-do # {todo_ids[0][0]}: {found[0].todo['Description']}?"
+        else:
+            question = f"Delete {len(found)} to-dos: " + ", ".join(
+                f"# {todo['ID']}: {todo['Description']}" for todo, _ in found
+            ) + "?"
+        delete = typer.confirm(question) #Call Typer’s confirm() once for the whole batch and store the result in delete.
           #This function provides an alternative way to ask for confirmation.
           #It allows to use a dynamically created confirmation prompt
         if delete:
@@ -202,6 +610,255 @@ def remove_all(
     else:
         typer.echo("Operation canceled")
 
+@app.command() #Define archive() as a Typer command using the @app.command() decorator
+def archive(
+        auto: Optional[int] = typer.Option(
+            None, "--auto", min=0, help="Archive automatically once more than this many to-dos are done, 0 turns it off."
+        ),
+) -> None:
+    """Move the done to-dos into a compressed archive, keeping the database small."""
+    todoer = get_todoer()
+    if auto is not None:
+        from clitodo import config
+        error = config.set_auto_archive(auto)
+        if error:
+            typer.secho(f'Saving the auto-archive threshold failed with "{ERRORS[error]}"', fg=typer.colors.RED)
+            raise typer.Exit(1)
+    todo_list, error = todoer.archive()
+    if error:
+        typer.secho(f'Archiving to-dos failed with "{ERRORS[error]}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    else:
+        typer.secho(f"{len(todo_list)} done to-dos were archived", fg=typer.colors.GREEN)
+
+@app.command() #Define compact() as a Typer command using the @app.command() decorator
+def compact() -> None:
+    """Fold the journal into a new database snapshot."""
+    todoer = get_todoer()
+    error = todoer.compact().error
+    if error:
+        typer.secho(
+            f'Compacting database failed with "{ERRORS[error]}"',
+            fg=typer.colors.RED,
+        )
+        raise typer.Exit(1)
+    else:
+        typer.secho("The to-do database was compacted", fg=typer.colors.GREEN)
+
+@app.command(name="cache") #Define cache_stats() as a Typer command using the @app.command() decorator
+def cache_stats(
+        clear: bool = typer.Option(
+            False,
+            "--clear",
+            help="Delete the parse caches and their counters.",
+        ),
+) -> None:
+    """Show parse cache hits and misses."""
+    from clitodo import config
+    from clitodo.cache import ParseCache
+    if not config.CONFIG_FILE_PATH.exists():
+        typer.secho('Config file not found. Please, run "clitodo init"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    caches = {"config": ParseCache(config.CONFIG_FILE_PATH)}
+    db_path, backend, *_ = _get_list_settings()
+    if backend in ("json", "journal"): #SQLite and the record store parse nothing up front, so they have no cache
+        caches["database"] = ParseCache(db_path)
+    for name, cache in caches.items():
+        if clear:
+            cache.clear()
+            continue
+        stats = cache.stats()
+        typer.echo(
+            f"{name}: {stats.hits} hits, {stats.misses} misses, "
+            f"{stats.hit_rate:.0%} hit rate"
+        )
+    if clear:
+        typer.secho("The parse caches were cleared", fg=typer.colors.GREEN)
+
+@app.command() #Define migrate() as a Typer command using the @app.command() decorator
+def migrate(
+        backend: str = typer.Option(
+            "sqlite",
+            "--backend",
+            "-b",
+            help=f"Target storage engine: {', '.join(BACKENDS)}.",
+        ),
+        db_path: Optional[str] = typer.Option(
+            None,
+            "--db-path",
+            "-db",
+            help="Target database location, defaults to the current one with a new suffix.",
+        ),
+) -> None:
+    """Convert the to-do database to another storage engine."""
+    from clitodo import config, database
+    if backend not in BACKENDS:
+        typer.secho(f'Unknown backend "{backend}"', fg=typer.colors.RED)
+        raise typer.Exit(1)
+    get_todoer() #Make sure a database exists before converting it
+    source_path, source_backend, fsync, _ = _get_list_settings()
+    target_path = Path(db_path) if db_path else source_path.with_suffix(
+        {"sqlite": ".db", "records": ".rec"}.get(backend, ".json")
+    )
+    if target_path.resolve() == source_path.resolve(): #Converting in place would destroy the source while reading it
+        typer.secho(
+            "The target database must differ from the current one", fg=typer.colors.RED
+        )
+        raise typer.Exit(1)
+    error = database.migrate_database(source_path, source_backend, target_path, backend)
+    if not error: #Archived to-dos follow the database to its new location
+        from clitodo.archive import Archive
+        try:
+            Archive(source_path).move_to(target_path)
+        except OSError:
+            error = DB_WRITE_ERROR
+    if not error:
+        if _list_name == DEFAULT_LIST:
+            error = config.init_app(str(target_path), backend, fsync) #Point config.ini to the converted database
+        else: #Named lists are converted one at a time, the others keep their engines
+            error = config.register_list(_list_name, str(target_path), backend)
+    if error:
+        typer.secho(
+            f'Migrating database failed with "{ERRORS[error]}"',
+            fg=typer.colors.RED,
+        )
+        raise typer.Exit(1)
+    else:
+        typer.secho(f"The to-do database is {target_path}", fg=typer.colors.GREEN)
+
+@contextmanager
+def _warm_session() -> Iterator["Todoer"]: #Keep one Todoer and its parsed list in memory until the with block ends
+    global _session_todoer
+    todoer = get_todoer()
+    with todoer.transaction(hold_lock=False) as transaction: #Every command joins this transaction instead of reading the database again,
+                                                             #other processes can still write and a conflicting flush fails
+        _session_todoer = todoer
+        try:
+            yield todoer
+        finally:
+            _session_todoer = None
+    if transaction.error: #The last flush happens when the transaction ends
+        typer.secho(
+            f'Saving to-dos failed with "{ERRORS[transaction.error]}"',
+            fg=typer.colors.RED,
+        )
+        raise typer.Exit(1)
+
+def _run_command(todoer: "Todoer", args: List[str]) -> int: #Run one clitodo command in this process and return its exit code
+    global _list_name
+    if args and args[0] in SESSION_BLOCKED:
+        typer.secho(f'"{args[0]}" can\'t run inside a session', fg=typer.colors.RED)
+        return 1
+    list_name = _list_name
+    error = todoer.reload() #Another process may have written since the last command, don't hand out its IDs again
+    if error:
+        typer.secho(f'Reading to-dos failed with "{ERRORS[error]}"', fg=typer.colors.RED)
+        return 1
+    try:
+        code = app(args=args, prog_name=__app_name__, standalone_mode=False) or 0
+    except typer.Abort:
+        typer.echo("Aborted!", err=True)
+        code = 1
+    except Exception as error: #Usage errors know how to print themselves
+        if not hasattr(error, "show"):
+            raise
+        error.show()
+        code = getattr(error, "exit_code", 1)
+    finally:
+        _list_name = list_name #Options of one command never carry over to the next
+    if code: #A failed command may have changed part of a batch, go back to what was saved
+        todoer.discard()
+        return code
+    error = todoer.flush() #Save the command's changes, the parsed list stays in memory
+    if error:
+        typer.secho(f'Saving to-dos failed with "{ERRORS[error]}"', fg=typer.colors.RED)
+        todoer.discard()
+        return 1
+    return 0
+
+@app.command() #Define shell() as a Typer command using the @app.command() decorator
+def shell() -> None:
+    """Run clitodo commands in an interactive session."""
+    import shlex
+    try:
+        import readline #Gives the prompt line editing and history where it's available
+    except ImportError:
+        pass
+    with _warm_session() as todoer:
+        typer.secho('Type a command like "add Get some milk", or "exit" to quit', fg=typer.colors.BLUE)
+        while True:
+            try:
+                line = input(f"{__app_name__}> ")
+            except (EOFError, KeyboardInterrupt): #Ctrl-D and Ctrl-C end the session
+                typer.echo()
+                break
+            try:
+                args = shlex.split(line)
+            except ValueError as error:
+                typer.secho(str(error), fg=typer.colors.RED)
+                continue
+            if args in (["exit"], ["quit"]):
+                break
+            if args:
+                _run_command(todoer, args)
+
+def _stop_serving(signum, frame) -> None: #Turn SIGTERM into the same clean shutdown as Ctrl-C
+    raise KeyboardInterrupt
+
+def _default_socket_path() -> Path:
+    from clitodo import client
+    return client.DEFAULT_SOCKET_PATH
+
+@app.command() #Define serve() as a Typer command using the @app.command() decorator
+def serve(
+        socket_path: Path = typer.Option(
+            _default_socket_path,
+            "--socket",
+            "-s",
+            help="Unix socket to listen on.",
+        ),
+) -> None:
+    """Serve clitodo commands from thin clients over a local Unix socket."""
+    import io
+    import signal
+    import socket
+    import socketserver
+    from contextlib import redirect_stderr, redirect_stdout
+    if socket_path.exists(): #Reuse the path of a server that is gone, but never steal a live one
+        with socket.socket(socket.AF_UNIX) as probe:
+            if probe.connect_ex(str(socket_path)) == 0:
+                typer.secho(f"A server is already listening on {socket_path}", fg=typer.colors.RED)
+                raise typer.Exit(1)
+        socket_path.unlink()
+    with _warm_session() as todoer:
+
+        class CommandHandler(socketserver.StreamRequestHandler): #Run one command per connection, see clitodo.client for the protocol
+            def handle(self) -> None:
+                try:
+                    args = json.loads(self.rfile.readline())
+                except ValueError:
+                    return
+                output = io.StringIO()
+                with redirect_stdout(output), redirect_stderr(output):
+                    sys.stdin = io.StringIO() #Confirmation prompts can't be answered, clients pass --force instead
+                    try:
+                        code = _run_command(todoer, [str(arg) for arg in args])
+                    finally:
+                        sys.stdin = sys.__stdin__
+                reply = {"exit_code": code, "output": output.getvalue()}
+                self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+        signal.signal(signal.SIGTERM, _stop_serving)
+        with socketserver.UnixStreamServer(str(socket_path), CommandHandler) as server:
+            typer.secho(f"Serving to-dos on {socket_path}", fg=typer.colors.GREEN)
+            try:
+                server.serve_forever() #Commands are handled one at a time, so they never interleave
+            except KeyboardInterrupt:
+                pass
+            finally:
+                socket_path.unlink(missing_ok=True)
+    typer.secho("The to-do database was saved", fg=typer.colors.GREEN)
+
 def _version_callback(value: bool) -> None:
     if value:
         typer.echo(f"{__app_name__} v{__version__}") #Prints the application name and version
@@ -209,6 +866,7 @@ def _version_callback(value: bool) -> None:
 
 @app.callback() #Define main() as a Typer callback using the @app.callback() decorator
 def main(
+        ctx: typer.Context,
         #Define version, which is of type Optional[bool]
         version: Optional[bool] = typer.Option(
             #The first argument to the initializer of Option
@@ -222,6 +880,54 @@ def main(
             callback=_version_callback,
             #Tells Typer that the version command-line option has precedence over commands in the current application
             is_eager=True,
-        )
+        ),
+        list_name: Optional[str] = typer.Option(
+            None, "--list", help="Use this named to-do list, it is created next to the default one on first use."
+        ),
+        profile: bool = typer.Option(
+            False, "--profile", help="Print the time and bytes spent in each phase of the command to stderr."
+        ),
+        profile_json: Optional[Path] = typer.Option(
+            None, "--profile-json", help="Write the phase breakdown to this file as JSON."
+        ),
+        cprofile: Optional[Path] = typer.Option(
+            None, "--cprofile", help="Dump cProfile statistics for the whole command to this file."
+        ),
 ) -> None:
-    return
\ No newline at end of file
+    global _list_name
+    if list_name is None and _session_todoer is None: #Without --list, shell and serve commands stay on the session's list
+        _list_name = DEFAULT_LIST
+    elif list_name is not None:
+        if not list_name.replace("-", "").replace("_", "").isalnum():
+            raise typer.BadParameter("use letters, digits, - and _", param_hint="'--list'")
+        if _session_todoer is not None and list_name != _list_name: #The session's Todoer holds its own list's to-dos
+            raise typer.BadParameter(f'a session only uses the list "{_list_name}" it was started on', param_hint="'--list'")
+        _list_name = list_name
+    trace = os.environ.get("CLITODO_TRACE", "") #Empty or 0 is off, 1 prints the breakdown, anything else is a JSON file to write it to
+    if trace == "0":
+        trace = ""
+    if trace and trace != "1" and profile_json is None:
+        profile_json = Path(trace)
+    if (profile or trace or profile_json or cprofile) and not timing.enabled: #Shell and serve sessions run this again for every command
+        _start_profiling(ctx, profile_json, cprofile)
+
+def _start_profiling(ctx: typer.Context, profile_json: Optional[Path], cprofile: Optional[Path]) -> None: #Turn the timers on and report when the command ends
+    timing.enabled = True
+    timing.record("startup", time.perf_counter() - timing.STARTED, 1) #Interpreter, imports and Typer's argument parsing
+    profiler = None
+    if cprofile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def report() -> None:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(str(cprofile)) #Read it with python -m pstats or snakeviz
+        data = timing.report()
+        if profile_json is not None:
+            profile_json.write_text(json.dumps(data, indent=2) + "\n")
+        else:
+            typer.echo(timing.format_report(data), err=True) #stderr keeps the command's own output clean
+
+    ctx.call_on_close(report)
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""This module provides a thin client for the CLI To-Do server"""
+# clitodo/client.py
+
+# Only the standard library is imported here, so sending a command to
+# "clitodo serve" skips the Typer startup the full CLI pays for.
+# Protocol: the client sends the command line as a JSON array followed by a
+# newline, the server answers with {"exit_code": int, "output": str}.
+
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+DEFAULT_SOCKET_PATH = Path(
+    os.environ.get("CLITODO_SOCKET", Path.home() / ".clitodo.sock")
+) #The socket "clitodo serve" listens on unless told otherwise
+
+def send(args: List[str], socket_path: Path = DEFAULT_SOCKET_PATH) -> dict:
+    """Run a command on the server and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(str(socket_path))
+        connection.sendall(json.dumps(args).encode() + b"\n")
+        with connection.makefile("rb") as reply:
+            return json.loads(reply.readline())
+
+def main(argv: Optional[List[str]] = None) -> int:
+    try:
+        reply = send(sys.argv[1:] if argv is None else argv)
+    except OSError as error: #No server is listening
+        print(f"Connecting to {DEFAULT_SOCKET_PATH} failed: {error}", file=sys.stderr)
+        return 1
+    sys.stdout.write(reply["output"])
+    return reply["exit_code"]
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,68 +1,411 @@
 """This module provides the CLI To-Do model-controller."""
 # clitodo/clitodo.py
 
+import calendar
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List, NamedTuple
+from typing import Any, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Tuple
 
-from clitodo import DB_READ_ERROR, ID_ERROR
-from clitodo.database import DatabaseHandler
+from clitodo import DB_READ_ERROR, DB_WRITE_ERROR, DEFAULT_FSYNC, DUE_ERROR, PRIORITY_ERROR, REPEATS, SUCCESS, timing
+from clitodo.archive import Archive
+from clitodo.database import (
+    DEFAULT_BACKEND, MAX_DUE, MIN_DUE, DatabaseSettings, ToDo, Transaction, get_database_handler
+)
+from clitodo.search import SearchIndex, State
+
+UNSAVED_STATE: State = (-1, "") #Stamps an index built from a transaction's unsaved list
 
 class CurrentToDo(NamedTuple): #Create a subclass of typing.NamedTuple with two fields
-    todo: Dict[str, Any] #The dictionary holding the information for the current to-do
+    todo: Mapping[str, Any] #The record holding the information for the current to-do
     error: int #The return or error code confirming if the current operation was successful or not
 
+class CurrentToDoList(NamedTuple): #Same as CurrentToDo, for operations touching many to-dos
+    todo_list: List[ToDo] #The to-dos affected by the current operation
+    error: int
+
+def _make_todo(
+        description: List[str], priority: int, due: Optional[str] = None, repeat: Optional[str] = None
+) -> CurrentToDo: #Build a new to do from user's input
+    description_text = " ".join(description)
+    if not description_text.endswith("."):
+        description_text += "."
+    todo = ToDo(description_text, priority, due=due, repeat=repeat)
+    if priority not in (1, 2, 3): #Priorities only range from 1 to 3
+        return CurrentToDo(todo, PRIORITY_ERROR)
+    if due is not None:
+        try:
+            todo.due = date.fromisoformat(due).isoformat()
+        except (TypeError, ValueError):
+            return CurrentToDo(todo, DUE_ERROR)
+        if not MIN_DUE <= todo.due <= MAX_DUE: #ISO dates compare like the days they name
+            return CurrentToDo(todo, DUE_ERROR)
+    if repeat is not None and (repeat not in REPEATS or due is None): #Recurring to-dos need a due date to move along
+        return CurrentToDo(todo, DUE_ERROR)
+    return CurrentToDo(todo, SUCCESS)
+
+def next_due(due: str, repeat: str) -> str:
+    """Return the due date of a recurring to-do's next occurrence."""
+    day = date.fromisoformat(due)
+    if repeat == "day":
+        return (day + timedelta(days=1)).isoformat()
+    if repeat == "week":
+        return (day + timedelta(weeks=1)).isoformat()
+    year, month = divmod(day.month, 12) #The same day next month, or its last day if the month is shorter
+    year, month = day.year + year, month + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1])).isoformat()
+
+def query_lists(
+        lists: Mapping[str, DatabaseSettings],
+        priority: Optional[int] = None,
+        done: Optional[bool] = None,
+        sort: str = "id",
+        reverse: bool = False,
+) -> List[Tuple[str, CurrentToDoList]]:
+    """Read and filter every named list, one process per shard, and return them in the given order.
+
+    Each shard is decoded, filtered and sorted in a worker process, so only
+    the matching to-dos travel back to the caller.
+    """
+    names = list(lists)
+    args = [(lists[name], priority, done, sort, reverse) for name in names]
+    if len(names) < 2: #A pool isn't worth starting for a single shard
+        return [(name, _query_shard(*arguments)) for name, arguments in zip(names, args)]
+    from concurrent.futures import ProcessPoolExecutor #Imported here, so commands that read one list don't pay for multiprocessing at startup
+    with ProcessPoolExecutor(max_workers=min(len(names), os.cpu_count() or 1)) as pool:
+        return list(zip(names, pool.map(_query_shard, *zip(*args))))
+
+def _query_shard(
+        settings: DatabaseSettings, priority: Optional[int], done: Optional[bool], sort: str, reverse: bool
+) -> CurrentToDoList: #Runs in a worker process
+    handler = get_database_handler(settings.path, settings.backend, settings.fsync)
+    try:
+        todo_list = [
+            todo for todo in handler.iter_todos()
+            if (priority is None or todo.priority == priority) and (done is None or todo.done == done)
+        ]
+    except (OSError, ValueError): #Missing or malformed shard
+        return CurrentToDoList([], DB_READ_ERROR)
+    if sort == "priority":
+        todo_list.sort(key=lambda todo: (todo.priority, todo.id))
+    if reverse:
+        todo_list.reverse()
+    return CurrentToDoList(todo_list, SUCCESS)
+
 class Todoer:
-    def __init__(self, db_path: Path) -> None:
-        self._db_handler= DatabaseHandler(db_path) # Falitate direct communication with the to-do database
-
-    def add(self, description: List[str], priority: int = 2) -> CurrentToDo:
-        """Add a new to-do to the database."""
-        description_text = " ".join(description)
-        if not description_text.endswith("."):
-            description_text += "."
-            todo = {
-                "Description": description_text,
-                "Priority": priority,
-                "Done": False,
-            } #Build a new to do from user's input
-            read = self._db_handler.read_todos() #Read the to-do list from the database
-            if read.error == DB_READ_ERROR: #Check if .read_todos() returns a DB_READ_ERROR.
-                return CurrentToDo(todo, read.error)
-            read.todo_list.append(todo)
-            write = self._db_handler.write_todos(read.todo_list) #Write the updated to-do list back to the database
-            return CurrentToDo(todo, write.error)
-
-    def get_todo_list(self) -> List[Dict[str, Any]]:
+    def __init__(
+            self, db_path: Path, backend: str = DEFAULT_BACKEND, fsync: str = DEFAULT_FSYNC, auto_archive: int = 0
+    ) -> None:
+        self._db_handler= get_database_handler(db_path, backend, fsync) # Falitate direct communication with the to-do database
+        self._search_index = SearchIndex(db_path)
+        self._archive = Archive(db_path)
+        self._auto_archive = auto_archive #Archive once more than this many to-dos are done, 0 never does
+        self._completed = False #Whether to-dos were completed since the last auto-archive check
+        self._index_operations: List[Tuple[str, Any]] = [] #Search index updates waiting for the write that makes them true
+        self._in_transaction = False
+        self._read_state: State = UNSAVED_STATE #The database state the open transaction's list was read or last saved at
+
+    def add(
+            self, description: List[str], priority: int = 2, due: Optional[str] = None, repeat: Optional[str] = None
+    ) -> CurrentToDo:
+        """Add a new to-do to the database, optionally due on an ISO date and repeating every day, week or month."""
+        todo, error = _make_todo(description, priority, due, repeat)
+        if error:
+            return CurrentToDo(todo, error)
+        with self._writing(): #Another clitodo process can't write between the read and the write
+            write = self._db_handler.add_todo(todo) #Let the storage engine append the new to-do
+            if not write.error:
+                self._index_operations.append(("add", todo))
+        return CurrentToDo(todo, write.error)
+
+    def add_many(self, items: Iterable[Tuple[List[str], int]]) -> CurrentToDoList:
+        """Add many to-dos from (description, priority) pairs in one write."""
+        todo_list = []
+        for description, priority in items: #Validate every item before anything is written
+            todo, error = _make_todo(description, priority)
+            if error: #The response holds the valid to-dos before the failing one
+                return CurrentToDoList(todo_list, error)
+            todo_list.append(todo)
+        with self._writing():
+            write = self._db_handler.add_todos(todo_list)
+            if not write.error:
+                self._index_operations.extend(("add", todo) for todo in todo_list)
+        return CurrentToDoList(todo_list, write.error)
+
+    @contextmanager
+    def transaction(self, hold_lock: bool = True) -> Iterator[Transaction]:
+        """Batch adds, completions and removals into one read and one write.
+
+        Changes are written when the with block ends, and discarded if it
+        raises. The yielded Transaction holds the error code of that write.
+        The database stays locked for the whole block unless hold_lock is
+        False, in which case the write fails with DB_CONFLICT_ERROR if
+        another process wrote the database in the meantime.
+        """
+        if self._in_transaction: #Nested transactions join the outer one
+            with self._db_handler.transaction(hold_lock) as transaction:
+                yield transaction
+            return
+        self._in_transaction = True
+        try:
+            with self._db_handler.transaction(hold_lock) as transaction:
+                self._read_state = self._state(self._db_handler.base_version)
+                yield transaction
+                base_state = self._state(self._db_handler.base_version) #The version the final write builds on, flushes move it along
+            if not transaction.error: #The search index follows the write the transaction just made
+                self._sync_index(base_state, self._state(self._db_handler.base_version))
+        finally:
+            self._in_transaction = False
+            self._index_operations = []
+        if not transaction.error:
+            self._archive_if_needed()
+
+    def get_todo_list(self) -> List[ToDo]:
         """Return the current to-do list."""
         read = self._db_handler.read_todos() #Get the entire to-do list from the database
         return read.todo_list
 
-    def set_done(self, todo_id: int) -> CurrentToDo:
-        """Set a to-do as done."""
-        read = self._db_handler.read_todos() #Read all the to-dos
-        if read.error: #Check if any error occurs during the reading
+    def iter_todos(self, offset: int = 0, limit: Optional[int] = None) -> Iterator[ToDo]:
+        """Yield to-dos lazily, skipping the first offset ones."""
+        stop = None if limit is None else offset + limit
+        todos = islice(self._db_handler.stream_todos(), offset, stop) #Raises OSError or ValueError while iterating over a bad database,
+                                                                       #streaming skips the parse cache, so the first page never waits for the whole list
+        return timing.timed_iter("read", todos) #Decoding happens as the caller iterates, so it is timed item by item
+
+    def stream_todos(self, priority: Optional[int] = None, done: Optional[bool] = None) -> Iterator[ToDo]:
+        """Yield the to-dos with this priority and done state, without holding the whole list in memory."""
+        todos = (
+            todo for todo in self._db_handler.stream_todos() #Raises OSError or ValueError while iterating over a bad database
+            if (priority is None or todo.priority == priority) and (done is None or todo.done == done)
+        )
+        return timing.timed_iter("read", todos)
+
+    def get_todo(self, todo_id: int) -> CurrentToDo:
+        """Return the to-do with the given ID."""
+        read = self._db_handler.get_todo(todo_id)
+        if not read.todo_list: #Invalid ID or unreadable database
             return CurrentToDo({}, read.error)
-        try:
-            todo = read.todo_list[todo_id - 1] #Catch invalid to-do IDs that translate to invalid indices in the underlying to-do list
-        except IndexError:
-            return CurrentToDo({}, ID_ERROR)
-        todo["Done"] = True #Set the to-do as done
-        write = self._db_handler.write_todos(read.todo_list) #Write the update back to the database
-        return CurrentToDo(todo, write.error)
+        return CurrentToDo(read.todo_list[0], read.error)
+
+    def set_done(self, todo_id: int) -> CurrentToDo:
+        """Set a to-do as done using its ID.
+
+        Completing a pending recurring to-do also adds its next occurrence,
+        in the same write.
+        """
+        if not self._in_transaction and not self._db_handler.CHEAP_LOOKUP: #Engines that read the whole list anyway complete in a transaction,
+                                                                            #so a recurring to-do costs no extra read
+            with self.transaction() as transaction: #A failed write loses neither the completion nor the next occurrence
+                done = self.set_done(todo_id)
+            return done._replace(error=done.error or transaction.error)
+        if not self._in_transaction:
+            with self._db_handler.locked(): #Nothing can complete the to-do between the check and the write
+                read = self._db_handler.get_todo(todo_id)
+                todo = read.todo_list[0] if read.todo_list else None
+                if todo is not None and todo.repeat and todo.due and not todo.done:
+                    with self.transaction() as transaction:
+                        done = self.set_done(todo_id)
+                    return done._replace(error=done.error or transaction.error)
+        with self._writing():
+            write = self._db_handler.complete_todo(todo_id) #The storage engine validates the ID and persists the change
+            if not write.error:
+                self._index_operations.append(("complete", todo_id))
+                self._completed = True
+                todo = write.todo_list[0]
+                if todo.repeat and todo.due and write.changed: #A recurring to-do comes back with its next due date, once
+                    following = ToDo(todo.description, todo.priority, due=next_due(todo.due, todo.repeat), repeat=todo.repeat)
+                    added = self._db_handler.add_todo(following)
+                    if added.error:
+                        write = write._replace(error=added.error)
+                    else:
+                        self._index_operations.append(("add", added.todo_list[0]))
+        if not write.todo_list: #Invalid ID or unreadable database
+            return CurrentToDo({}, write.error)
+        if not self._in_transaction: #Transactions check when they end
+            self._archive_if_needed()
+        return CurrentToDo(write.todo_list[0], write.error)
 
     def remove(self, todo_id: int) -> CurrentToDo:
-        """Remove a to-do from the database using its id or index."""
-        read = self._db_handler.read_todos() #Read the to-do list from the database
-        if read.error: #Checks if any error occurs during the reading process
-            return CurrentToDo({}, read.error)
-        try: #Catch any invalid ID coming from the user’s input
-            todo = read.todo_list.pop(todo_id - 1)
-        except IndexError:
-            return CurrentToDo({}, ID_ERROR)
-        write = self._db_handler.write_todos(read.todo_list) #Write the updated to-do list back to the database
-        return CurrentToDo(todo, write.error)
+        """Remove a to-do from the database using its ID."""
+        with self._writing():
+            write = self._db_handler.remove_todo(todo_id) #The storage engine validates the ID and persists the change
+            if not write.error:
+                self._index_operations.append(("remove", todo_id))
+        if not write.todo_list: #Invalid ID or unreadable database
+            return CurrentToDo({}, write.error)
+        return CurrentToDo(write.todo_list[0], write.error)
 
     def remove_all(self) -> CurrentToDo:
         """Remove all to-dos from the database."""
-        write = self._db_handler.write_todos([])
-        return CurrentToDo({}, write.error)
\ No newline at end of file
+        with self._writing():
+            write = self._db_handler.clear_todos()
+            if not write.error:
+                self._index_operations.append(("clear", None))
+        return CurrentToDo({}, write.error)
+
+    def flush(self) -> int:
+        """Write the open transaction's changes and keep it open."""
+        base_state = self._state(self._db_handler.base_version)
+        error = self._db_handler.flush()
+        if error:
+            self._index_operations = []
+        else:
+            self._read_state = self._state(self._db_handler.base_version)
+            self._sync_index(base_state, self._read_state)
+        return error
+
+    def discard(self) -> int:
+        """Drop the open transaction's unsaved changes."""
+        self._index_operations = []
+        error = self._db_handler.discard()
+        self._read_state = self._state(self._db_handler.base_version)
+        return error
+
+    def reload(self) -> int:
+        """Read the database again if something else wrote it since the open transaction read it.
+
+        Unsaved changes are dropped along with the old list, so long
+        sessions call it between commands, right after a flush.
+        """
+        if self._state(self._db_handler.version()) == self._read_state:
+            return SUCCESS
+        return self.discard()
+
+    def search(self, terms: List[str], limit: int = 20) -> CurrentToDoList:
+        """Return the to-dos whose descriptions contain every term, best matches first.
+
+        Terms also match longer words that start with them. The index is
+        only rebuilt when the database changed without going through it.
+        """
+        try:
+            self._refresh_index()
+            ranked = self._search_index.search(terms, limit)
+        except (OSError, ValueError, sqlite3.Error): #Unreadable database or index
+            return CurrentToDoList([], DB_READ_ERROR)
+        read = self._db_handler.get_todos([todo_id for todo_id, _ in ranked])
+        return CurrentToDoList(read.todo_list, read.error)
+
+    def query(
+            self,
+            priority: Optional[int] = None,
+            done: Optional[bool] = None,
+            sort: str = "id",
+            reverse: bool = False,
+            offset: int = 0,
+            limit: Optional[int] = None,
+    ) -> CurrentToDoList:
+        """Return the to-dos with this priority and done state, in sort order.
+
+        The IDs come from the priority and done indexes kept next to the
+        database, so only the matching to-dos are read.
+        """
+        try:
+            self._refresh_index()
+            todo_ids = self._search_index.query(priority, done, sort, reverse, offset, limit)
+        except (OSError, ValueError, sqlite3.Error):
+            return CurrentToDoList([], DB_READ_ERROR)
+        read = self._db_handler.get_todos(todo_ids)
+        return CurrentToDoList(read.todo_list, read.error)
+
+    def archive(self) -> CurrentToDoList:
+        """Move the done to-dos into a new compressed archive segment.
+
+        Runs in a transaction of its own: the segment is dropped again if
+        the database write fails, which an outer transaction's later
+        discard couldn't do, so calling it inside one raises RuntimeError.
+        """
+        if self._in_transaction:
+            raise RuntimeError("archive() can't run inside a transaction")
+        segment = None
+        with self.transaction() as transaction:
+            try:
+                todo_list = [todo for todo in self._db_handler.iter_todos() if todo.done]
+            except (OSError, ValueError):
+                return CurrentToDoList([], DB_READ_ERROR)
+            if not todo_list:
+                return CurrentToDoList([], SUCCESS)
+            try:
+                segment = self._archive.append(todo_list, self._db_handler.fsync) #Written first, a crash leaves copies instead of losing to-dos
+            except OSError:
+                return CurrentToDoList([], DB_WRITE_ERROR)
+            for todo in todo_list:
+                self.remove(todo.id)
+        if transaction.error: #The to-dos are still in the database
+            self._archive.drop(segment)
+            return CurrentToDoList([], transaction.error)
+        return CurrentToDoList(todo_list, SUCCESS)
+
+    def due(self, within: int, today: Optional[date] = None, limit: Optional[int] = None) -> CurrentToDoList:
+        """Return the pending to-dos due in the next within days, overdue ones included, soonest first.
+
+        The IDs come from the due date index kept next to the database, so
+        only the matching to-dos are read.
+        """
+        until = ((today or date.today()) + timedelta(days=within)).isoformat()
+        try:
+            self._refresh_index()
+            todo_ids = self._search_index.due(until, limit)
+        except (OSError, ValueError, sqlite3.Error):
+            return CurrentToDoList([], DB_READ_ERROR)
+        read = self._db_handler.get_todos(todo_ids)
+        return CurrentToDoList(read.todo_list, read.error)
+
+    def iter_archived(self, priority: Optional[int] = None, done: Optional[bool] = None) -> Iterator[ToDo]:
+        """Yield the archived to-dos with this priority and done state, reading one segment at a time."""
+        todos = (
+            todo for todo in self._archive.iter_todos() #Raises OSError or ValueError on damaged segments
+            if (priority is None or todo.priority == priority) and (done is None or todo.done == done)
+        )
+        return timing.timed_iter("read", todos)
+
+    def compact(self) -> CurrentToDo:
+        """Fold the storage engine's journal into a new snapshot."""
+        with self._writing():
+            write = self._db_handler.compact()
+        return CurrentToDo({}, write.error)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]: #Run one write under the database lock, then bring the search index along
+        if self._in_transaction: #The transaction's write carries the index updates
+            yield
+            return
+        with self._db_handler.locked():
+            base_state = self._state(self._db_handler.version())
+            try:
+                yield
+            finally:
+                self._sync_index(base_state, self._state(self._db_handler.version()))
+
+    def _archive_if_needed(self) -> None: #Archive when completions pushed the done to-dos past the auto-archive threshold
+        if not self._auto_archive or not self._completed:
+            return
+        self._completed = False
+        try:
+            self._refresh_index()
+            done_ids = self._search_index.query(None, True, "id", False, 0, self._auto_archive + 1) #Counting stops past the threshold
+        except (OSError, ValueError, sqlite3.Error):
+            return
+        if len(done_ids) > self._auto_archive:
+            self.archive()
+
+    def _refresh_index(self) -> None: #Rebuild the indexes if the database changed without going through them,
+                                      #by another clitodo process or by an edit outside clitodo
+        with self._db_handler.locked():
+            state = self._state(self._db_handler.version())
+            if self._in_transaction and (self._index_operations or self._db_handler.base_version != state[0]):
+                #The open transaction's list isn't what the database holds: the rebuild follows the list,
+                #but is stamped with a state nothing matches, so it's rebuilt again once the transaction ends
+                self._search_index.rebuild(self._db_handler.iter_todos(), UNSAVED_STATE)
+            elif self._search_index.state() != state:
+                self._search_index.rebuild(self._db_handler.iter_todos(), state)
+
+    def _state(self, version: int) -> State: #Pair a database version with the files key it was written as
+        return version, self._db_handler.files_key()
+
+    def _sync_index(self, base_state: State, state: State) -> None: #Apply the queued index updates made on base_state
+        operations, self._index_operations = self._index_operations, []
+        if state[0] != base_state[0]: #Nothing was written, so the index is as current as before
+            self._search_index.update(operations, base_state, state)
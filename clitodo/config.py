@@ -7,18 +7,18 @@ from pathlib import Path #This class provides a cross-platform way to handle sys
 import typer
 
 from clitodo import (
-    DB_WRITE_ERROR, DIR_ERROR, FILE_ERROR, SUCCESS, __app_name__
+    DB_WRITE_ERROR, DEFAULT_FSYNC, DIR_ERROR, FILE_ERROR, LIST_SECTION, SUCCESS, __app_name__
 )
 
 CONFIG_DIR_PATH = Path(typer.get_app_dir(__app_name__)) #Hold the path to the app's directory
 CONFIG_FILE_PATH = CONFIG_DIR_PATH / "config.ini" #Hold the path to the configuration file itself
 
-def init_app(db_path: str) -> int:
+def init_app(db_path: str, backend: str = "json", fsync: str = DEFAULT_FSYNC) -> int:
     """Initialize the application.""" #Initialize the application's configuration file and database
     config_code = _init_config_file()
     if config_code != SUCCESS: #Check if an error occurs during the creation of the directory and configuration file
         return config_code #Return the error code
-    database_code = _create_database(db_path)
+    database_code = _create_database(db_path, backend, fsync)
     if database_code != SUCCESS: #Check if an error occurs during the creation of the database
         return database_code #Return the corresponding error code
     return SUCCESS
@@ -34,12 +34,32 @@ def _init_config_file() -> int: #Helper function
         return FILE_ERROR #Return the error code if something wrong happens during the creation of the file
     return SUCCESS
 
-def _create_database(db_path: str) -> int: #Helper function, creates the to-do database
+def register_list(name: str, db_path: str, backend: str) -> int:
+    """Add a named to-do list to the config file, or point an existing one to a new shard file."""
     config_parser = configparser.ConfigParser()
-    config_parser["General"] = {"database": db_path}
+    config_parser.read(CONFIG_FILE_PATH)
+    config_parser[LIST_SECTION + name] = {"database": db_path, "backend": backend}
+    return _write_config(config_parser)
+
+def set_auto_archive(threshold: int) -> int:
+    """Save how many done to-dos trigger an automatic archive, 0 turns it off."""
+    config_parser = configparser.ConfigParser()
+    config_parser.read(CONFIG_FILE_PATH)
+    config_parser["General"]["auto_archive"] = str(threshold)
+    return _write_config(config_parser)
+
+def _create_database(db_path: str, backend: str, fsync: str) -> int: #Helper function, creates the to-do database
+    config_parser = configparser.ConfigParser()
+    config_parser.read(CONFIG_FILE_PATH) #Keep the named lists and other settings made so far
+    if "General" not in config_parser:
+        config_parser["General"] = {}
+    config_parser["General"].update({"database": db_path, "backend": backend, "fsync": fsync}) #The "backend" key selects the storage engine, "fsync" how hard writes hit the disk
+    return _write_config(config_parser)
+
+def _write_config(config_parser: configparser.ConfigParser) -> int: #Helper function, saves the config file
     try:
         with CONFIG_FILE_PATH.open("w") as file:
             config_parser.write(file)
     except OSError:
         return DB_WRITE_ERROR #Return the appropriate error code if something wrong happens while creating the database
-    return SUCCESS
\ No newline at end of file
+    return SUCCESS
@@ -3,53 +3,1355 @@
 
 import configparser #This module provides the ConfigParser class, which allows you to handle config files with a structure similar to INI files
 import json
+import mmap #This module maps the record store into memory so single fields can be read and patched in place
+import os
+import sqlite3 #This module provides the SQLite storage engine from the standard library
+import struct #This module packs the record store's fixed-width header and records
+import tempfile
+from collections.abc import Mapping
+from contextlib import closing, contextmanager, nullcontext
+from datetime import date
 from pathlib import Path #This class provides a cross-platform way to handle system paths
-from typing import Any, Dict, List, NamedTuple
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
-from clitodo import DB_READ_ERROR, DB_WRITE_ERROR, JSON_ERROR, SUCCESS
+from clitodo import (
+    BACKENDS, DB_CONFLICT_ERROR, DB_READ_ERROR, DB_WRITE_ERROR, DEFAULT_BACKEND, DEFAULT_FSYNC,
+    DEFAULT_LIST, ID_ERROR, JSON_ERROR, LIST_SECTION, REPEATS, SUCCESS
+)
+from clitodo import timing
+from clitodo.cache import CacheStats, ParseCache, file_key
+
+try:
+    import fcntl #Advisory file locks, only available on Unix
+except ImportError: #Without it writes are still atomic, but concurrent commands may overwrite each other
+    fcntl = None
 
 DEFAULT_DB_FILE_PATH = Path.home().joinpath(
     "." +Path.home().stem + "_todo.json"
 ) # Create a holder for the default database file path
   # The application will use this path if the user doesn't provide a custom one
+CHUNK_SIZE = 64 * 1024 #Number of characters read at a time when streaming a JSON database
+DUE_EPOCH = date(1969, 12, 31).toordinal() #The record store keeps due dates as 16-bit day numbers counted from here, 0 means none
+MIN_DUE, MAX_DUE = date.fromordinal(DUE_EPOCH + 1).isoformat(), date.fromordinal(DUE_EPOCH + 0xFFFF).isoformat() #So every engine accepts due dates in this range
+
+class DatabaseSettings(NamedTuple):
+    path: Path #The to-do database file
+    backend: str #The storage engine
+    fsync: str #The fsync policy, one of FSYNC_POLICIES
+    auto_archive: int = 0 #Archive done to-dos once there are more than this many, 0 never does
+
+@timing.timed("config")
+def get_list_settings(config_file: Path) -> Dict[str, DatabaseSettings]:
+    """Return the settings of every to-do list in the config file, the [General] one first."""
+    cache = ParseCache(config_file)
+    try:
+        key = file_key(config_file.stat())
+    except OSError:
+        key = None
+    settings = cache.load(key) if key else None
+    if settings is None: #Parse config.ini only when it changed since the last command
+        config_parser = configparser.ConfigParser()
+        config_parser.read(config_file)
+        settings = (
+            config_parser["General"]["database"], # The "General" key represents the file section that stores the required information
+                                                  # The "database" key retireves tha database path
+            config_parser["General"].get("backend", DEFAULT_BACKEND), #Config files written before the "backend" key existed use the JSON engine
+            config_parser["General"].get("fsync", DEFAULT_FSYNC),
+            config_parser["General"].getint("auto_archive", 0),
+            tuple(
+                (section[len(LIST_SECTION):], config_parser[section]["database"], config_parser[section].get("backend", DEFAULT_BACKEND))
+                for section in config_parser.sections() if section.startswith(LIST_SECTION)
+            ), #Named lists live in sections of their own, each with its own shard file
+        )
+        if key:
+            cache.store(key, settings)
+    path, backend, fsync, auto_archive, lists = settings
+    list_settings = {DEFAULT_LIST: DatabaseSettings(Path(path), backend, fsync, auto_archive)}
+    for name, path, backend in lists: #Every list shares the fsync policy and auto-archive threshold in [General]
+        list_settings[name] = DatabaseSettings(Path(path), backend, fsync, auto_archive)
+    return list_settings
+
+def get_database_settings(config_file: Path, list_name: str = DEFAULT_LIST) -> DatabaseSettings:
+    """Return the database path, storage engine and fsync policy of a to-do list, raises KeyError for unknown lists."""
+    return get_list_settings(config_file)[list_name]
 
 def get_database_path(config_file: Path) -> Path:
     """Return the current path to the to-do database."""
-    config_parser = configparser.ConfigParser()
-    config_parser.read(config_file)
-    return Path(config_parser["General"]["database"])# The "General" key represents the file section that stores the required information
-                                                     # The "database" key retireves tha database path
+    return get_database_settings(config_file).path
+
+def get_database_backend(config_file: Path) -> str:
+    """Return the storage engine selected in the config file."""
+    return get_database_settings(config_file).backend
 
-def init_database(db_path: Path) -> int:
+def init_database(db_path: Path, backend: str = DEFAULT_BACKEND) -> int:
     """Create the to-do database."""
+    return get_database_handler(db_path, backend).write_todos([]).error #Empty to-do list, the list initializes the database
+
+class ToDo(Mapping): #A single to-do record, kept in slots instead of a per-item dictionary
+    __slots__ = ("id", "description", "priority", "done", "due", "repeat")
+    FIELDS = {
+        "ID": "id", "Description": "description", "Priority": "priority", "Done": "done", "Due": "due", "Repeat": "repeat"
+    } #Maps the JSON keys to the slot names
+
+    def __init__(
+            self,
+            description: str,
+            priority: int = 2,
+            done: bool = False,
+            id: Optional[int] = None,
+            due: Optional[str] = None,
+            repeat: Optional[str] = None,
+    ) -> None:
+        self.id = id #Stable ID, assigned by the storage engine when the to-do is saved
+        self.description = description
+        self.priority = priority
+        self.done = done
+        self.due = due #ISO date like 2026-11-01, or None
+        self.repeat = repeat #One of REPEATS for recurring to-dos, or None
+
+    @classmethod
+    def from_dict(cls, todo: Dict[str, Any]) -> "ToDo": #Build a record from its JSON object, raises ValueError on malformed objects
+        try:
+            return cls(todo["Description"], todo["Priority"], todo["Done"], todo.get("ID"), todo.get("Due"), todo.get("Repeat"))
+        except (KeyError, TypeError, AttributeError) as error:
+            raise ValueError(f"malformed to-do: {todo!r}") from error
+
+    def to_dict(self) -> Dict[str, Any]: #Return the JSON object stored in the database
+        todo = {"ID": self.id, "Description": self.description, "Priority": self.priority, "Done": self.done}
+        if self.due is not None: #To-dos without a due date are stored exactly as before due dates existed
+            todo["Due"] = self.due
+        if self.repeat is not None:
+            todo["Repeat"] = self.repeat
+        return todo
+
+    def __getitem__(self, key: str) -> Any: #Records can still be read like the dictionaries they replace
+        return getattr(self, self.FIELDS[key])
+
+    def __iter__(self) -> Iterator[str]: #Due and Repeat only show up when set, like in the stored JSON
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __repr__(self) -> str:
+        return (
+            f"ToDo({self.description!r}, {self.priority!r}, {self.done!r}, id={self.id!r}"
+            f"{f', due={self.due!r}' if self.due else ''}{f', repeat={self.repeat!r}' if self.repeat else ''})"
+        )
+
+def _to_json(todo: ToDo) -> Dict[str, Any]: #The json module calls this for every record it can't serialize itself
+    return todo.to_dict()
+
+@contextmanager
+def _atomic_file(path: Path, mode: str, fsync: str) -> Iterator[Any]: #Write a temporary file and swap it in, so readers see the old or the new file, never half of one
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
     try:
-        db_path.write_text("[]") #Empty to-do list, the list initializes the JSON database
-        return SUCCESS
-    except OSError:
-        return DB_WRITE_ERROR
+        os.chmod(temp_name, _file_mode(path)) #mkstemp creates the file private, the swapped-in file keeps the permissions it had
+        with os.fdopen(fd, mode) as file:
+            yield file
+            file.flush()
+            if fsync != "off": #The data must be on disk before the rename makes it visible
+                os.fsync(file.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+    if fsync == "full": #Persist the rename itself
+        _fsync_directory(path.parent)
+
+def _file_mode(path: Path) -> int: #Return the existing file's permission bits, or the umask's default for new files
+    try:
+        return path.stat().st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0) #The umask can only be read by setting it
+        os.umask(umask)
+        return 0o666 & ~umask
+
+def _fsync_directory(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError: #Some platforms can't open directories
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _to_columns(todo_list: List[ToDo]) -> Tuple[list, ...]: #Split the records into the constructor's argument columns
+    return (
+        [todo.description for todo in todo_list],
+        [todo.priority for todo in todo_list],
+        [todo.done for todo in todo_list],
+        [todo.id for todo in todo_list],
+        [todo.due for todo in todo_list],
+        [todo.repeat for todo in todo_list],
+    ) #Four flat lists load much faster than one tuple per to-do, map(ToDo, *columns) rebuilds the records
+
+def _files_key(*paths: Path) -> str: #Identify the current contents of the database files by their mtimes, sizes and inodes
+    keys = []
+    for path in paths:
+        try:
+            keys.append(":".join(map(str, file_key(path.stat()))))
+        except OSError: #A missing journal is a state of its own
+            keys.append("-")
+    return "|".join(keys)
+
+def _number_todos(todos: Iterable[Any]) -> Iterator[ToDo]: #Give to-dos saved before IDs existed the next free ID,
+                                                          #raises ValueError for array elements that aren't to-do objects
+    todos = map(_checked_todo, todos)
+    last_id = 0
+    for todo in todos:
+        if todo.id is None: #The rest of the file is read to find its highest ID, so hand-edited files mixing both get no duplicates
+            rest = [todo, *todos]
+            next_id = max([last_id] + [todo.id for todo in rest if todo.id is not None]) + 1 #In files without IDs this is the to-do's position,
+                                                                                              #the ID users already know
+            for todo in rest:
+                if todo.id is None:
+                    todo.id = next_id
+                    next_id += 1
+                yield todo
+            return
+        last_id = max(last_id, todo.id)
+        yield todo
+
+def _checked_todo(todo: Any) -> ToDo:
+    if not isinstance(todo, ToDo): #A number, string or list in the array, or a file that isn't an array at all
+        raise ValueError(f"not a to-do object: {todo!r}")
+    return todo
+
+class ToDoIndex: #Hash index from stable to-do IDs to their position in a to-do list
+    def __init__(self, todo_list: List[ToDo], next_id: int = 1) -> None:
+        self._todo_list = todo_list
+        self._positions = {todo.id: position for position, todo in enumerate(todo_list)}
+        self.next_id = max(max(self._positions, default=0) + 1, next_id) #IDs are assigned in increasing order and never handed out twice,
+                                                                          #next_id is the stored mark that outlives removed to-dos
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def get(self, todo_id: int) -> Optional[ToDo]: #Return the to-do with this ID, or None
+        position = self._positions.get(todo_id)
+        return None if position is None else self._todo_list[position]
+
+    def add(self, todo: ToDo) -> ToDo: #Append a to-do, giving it the next ID if it doesn't have one
+        if todo.id is None:
+            todo.id = self.next_id
+        self.next_id = max(self.next_id, todo.id + 1)
+        self._positions[todo.id] = len(self._todo_list)
+        self._todo_list.append(todo)
+        return todo
+
+    def remove(self, todo_id: int) -> Optional[ToDo]: #Leave a tombstone instead of shifting every later to-do
+        position = self._positions.pop(todo_id, None)
+        if position is None:
+            return None
+        todo = self._todo_list[position]
+        self._todo_list[position] = None
+        return todo
+
+    def clear(self) -> None: #Drop every to-do but keep handing out increasing IDs
+        self._todo_list.clear()
+        self._positions.clear()
+
+    def todos(self) -> List[ToDo]: #Return the live to-dos, tombstones are reclaimed here before saving
+        return [todo for todo in self._todo_list if todo is not None]
+
+def migrate_database(
+        source_path: Path, source_backend: str, target_path: Path, target_backend: str
+) -> int:
+    """Copy every to-do from one database into a new one in a single pass."""
+    source = get_database_handler(source_path, source_backend)
+    target = get_database_handler(target_path, target_backend)
+    try:
+        return target.load_todos(source.iter_todos(), source.next_id()).error #The source is streamed straight into the target, IDs and ID counter included
+    except (OSError, ValueError): #Catch errors raised while streaming the source database
+        return DB_READ_ERROR
+
+def _iter_json_array(db) -> Iterator[ToDo]: #Decode a JSON array one element at a time instead of loading it whole
+    decoder = json.JSONDecoder(object_hook=ToDo.from_dict)
+    buffer = db.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise json.JSONDecodeError("Expecting '['", buffer, 0)
+    position = 1
+    while True:
+        while True: #Skip separators, reading more text whenever the buffer runs dry
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer):
+                break
+            chunk = db.read(CHUNK_SIZE)
+            if not chunk:
+                raise json.JSONDecodeError("Expecting ']'", buffer, position)
+            buffer, position = chunk, 0
+        if buffer[position] == "]":
+            return
+        try:
+            todo, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = db.read(CHUNK_SIZE) #The element is cut off at the end of the buffer
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield todo
+        position = end
 
 class DBResponse(NamedTuple):
-    todo_list: List[Dict[str, Any]] #The to-do list users will write and read from the database
+    todo_list: List[ToDo] #The to-do list users will write and read from the database
     error: int #An integer number representing a return code related to the current database operation
+    changed: bool = True #False when there was nothing to change, like completing a done to-do
+
+class Transaction: #Handed out by DatabaseHandler.transaction(), error holds the result of the single write at the end
+    def __init__(self) -> None:
+        self.error = SUCCESS
 
 class DatabaseHandler: #Allow users to read and write data to the to-do database using the json module from the standard library
+    CHEAP_LOOKUP = False #Whether get_todo finds one to-do without reading the whole list
+
     def __init__(self, db_path: Path) -> None: #Define class initializer
         self._db_path = db_path
+        self._cache = ParseCache(db_path) #Decoded copy of the JSON file, skips json.load while the file is unchanged
+        self._lock_path = db_path.with_name(db_path.name + ".lock") #Locked while a command reads and writes, also holds the version number
+        self._ids_path = db_path.with_name(db_path.name + ".ids") #Next free ID, only written once the to-dos in the file no longer imply it
+        self._locked = False #Whether this handler holds the lock, so nested operations don't lock twice
+        self.fsync = DEFAULT_FSYNC #One of FSYNC_POLICIES
+        self._batch: Optional[ToDoIndex] = None #The in-memory to-do list while a transaction is open
+        self._batch_error = SUCCESS #The error from reading the database when the transaction started
+        self._batch_version = 0 #The database version the transaction read
+        self._dirty = False #Whether the open transaction changed anything
 
+    @timing.timed("read")
     def read_todos(self) -> DBResponse: #This method reads the to-do list from tha database and deserializes it
         try: #Catch any errors that occur while users are opening the database
             with self._db_path.open("r") as db:
+                key = file_key(os.fstat(db.fileno()))
+                timing.record("read", size=key[1])
+                columns = self._cache.load(key)
+                if columns is not None: #The file hasn't changed since it was last parsed
+                    return DBResponse(list(map(ToDo, *columns)), SUCCESS)
                 try:
-                    return DBResponse(json.load(db), SUCCESS)
-                except json.JSONDecodeError: #Catch wrong JSON format
+                    todo_list = self._parse(db, key)
+                except (ValueError, TypeError): #Catch wrong JSON format or malformed to-dos
                     return DBResponse([], DB_READ_ERROR)
         except OSError: #Catch file IO problems
             return DBResponse([], DB_READ_ERROR)
+        return DBResponse(todo_list, SUCCESS)
 
-    def write_todos(self, todo_list: List[Dict[str, Any]]) -> DBResponse: #Take a list of to-do dictionaries and write it to the database
+    def _parse(self, db: Any, key: Tuple[int, int, int]) -> List[ToDo]: #Decode the open database file and cache the result for the next read,
+                                                                        #raises ValueError or TypeError on bad JSON
+        todo_list = list(_number_todos(json.load(db, object_hook=ToDo.from_dict)))
+        self._cache.store(key, _to_columns(todo_list))
+        return todo_list
+
+    @timing.timed("write")
+    def write_todos(self, todo_list: List[ToDo], next_id: int = 1) -> DBResponse: #Take a list of to-do records and write it to the database,
+                                                                                  #next_id is the lowest ID later to-dos may get
         try: #Catch any errors that occur while users are opening the database
-            with self._db_path.open("w") as db: #Open the database for writing
-                json.dump(todo_list, db, indent=4) #Dump the to-do list as a JSON payload into the database
-            return DBResponse(todo_list, SUCCESS)
+            next_id = max(next_id, self.next_id())
+            if next_id > max((todo.id or 0 for todo in todo_list), default=0) + 1: #The newest to-dos were removed, remember their IDs
+                self._ids_path.write_text(str(next_id)) #Written first, so a crash can only leave the counter too high
+            with _atomic_file(self._db_path, "w", self.fsync) as db: #A crash mid-write leaves the previous database in place
+                json.dump(todo_list, db, indent=4, default=_to_json) #Dump the to-do list as a JSON payload into the database
+            key = file_key(self._db_path.stat())
+            timing.record("write", size=key[1])
         except OSError: #Catch file IO problems
-            return DBResponse(todo_list, DB_WRITE_ERROR)
\ No newline at end of file
+            return DBResponse(todo_list, DB_WRITE_ERROR)
+        self._bump_version()
+        self._cache.store(key, _to_columns(todo_list)) #The next read can skip json.load
+        return DBResponse(todo_list, SUCCESS)
+
+    def next_id(self) -> int: #Return the stored next free ID, the to-dos themselves may imply a higher one
+        try:
+            return int(self._ids_path.read_text())
+        except (OSError, ValueError): #No removal has outrun the to-dos in the file yet
+            return 1
+
+    def files_key(self) -> str:
+        """Identify the current contents of the database files.
+
+        Unlike version(), this also changes when the files are edited
+        outside clitodo, like ParseCache keys do.
+        """
+        return _files_key(self._db_path)
+
+    def cache_stats(self) -> CacheStats: #Return the parse cache's hits and misses
+        return self._cache.stats()
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
+    def iter_todos(self) -> Iterator[ToDo]: #Stream the to-dos one at a time, raises OSError or ValueError on bad files
+        if self._batch is not None: #The open transaction already holds the current list
+            yield from self._batch.todos()
+            return
+        with self._db_path.open("r") as db:
+            key = file_key(os.fstat(db.fileno()))
+            timing.record("read", size=key[1])
+            columns = self._cache.load(key)
+            if columns is not None: #A cached file skips the JSON decoder entirely
+                yield from map(ToDo, *columns)
+                return
+            yield from _number_todos(_iter_json_array(db))
+
+    def stream_todos(self) -> Iterator[ToDo]: #Like iter_todos, but memory stays flat for any size, so the parse cache is skipped
+        if self._batch is not None:
+            yield from self._batch.todos()
+            return
+        with self._db_path.open("r") as db:
+            timing.record("read", size=os.fstat(db.fileno()).st_size)
+            yield from _number_todos(_iter_json_array(db))
+
+    def load_todos(self, todos: Iterable[ToDo], next_id: int = 1) -> DBResponse: #Replace the database content with the given to-dos
+        index = ToDoIndex([], next_id)
+        for todo in todos:
+            index.add(todo)
+        return DBResponse([], self.write_todos(index.todos(), index.next_id).error)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]: #Hold the database's advisory lock, other clitodo processes wait for it
+        if self._locked or fcntl is None:
+            yield
+            return
+        try:
+            lock_file = self._lock_path.open("a")
+        except OSError: #The operation itself will report the unusable directory
+            yield
+            return
+        with lock_file: #Closing the file releases the lock, even if the process dies
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._locked = True
+            try:
+                yield
+            finally:
+                self._locked = False
+
+    @contextmanager
+    def transaction(self, hold_lock: bool = True) -> Iterator[Transaction]: #Run every operation inside the with block against one read and one write
+        """Batch operations into one read and one write.
+
+        With hold_lock the database stays locked for the whole block. Long
+        sessions pass False instead: the changes are then only written if
+        no other process wrote the database since it was read, otherwise
+        the write fails with DB_CONFLICT_ERROR.
+        """
+        transaction = Transaction()
+        if self._batch is not None: #Nested transactions join the outer one
+            yield transaction
+            return
+        with self.locked() if hold_lock else nullcontext():
+            self._begin()
+            try:
+                yield transaction #An exception inside the with block discards every change
+                transaction.error = self._batch_error or self._commit_checked()
+            finally:
+                self._batch = None
+                self._rollback()
+
+    def add_todo(self, todo: ToDo) -> DBResponse: #Append a single to-do, the response holds the added to-do with its new ID
+        return self.add_todos([todo])
+
+    def add_todos(self, todos: List[ToDo]) -> DBResponse: #Append many to-dos with a single read and a single write
+        index, error = self._load()
+        if error:
+            return DBResponse(todos, error)
+        for todo in todos:
+            index.add(todo)
+        return DBResponse(todos, self._save(index))
+
+    def complete_todo(self, todo_id: int) -> DBResponse: #Set a to-do as done, the response holds the completed to-do
+        index, error = self._load()
+        if error:
+            return DBResponse([], error)
+        todo = index.get(todo_id)
+        if todo is None:
+            return DBResponse([], ID_ERROR)
+        was_done, todo.done = todo.done, True
+        return DBResponse([todo], self._save(index), not was_done)
+
+    def remove_todo(self, todo_id: int) -> DBResponse: #Delete a to-do, the response holds the removed to-do
+        index, error = self._load()
+        if error:
+            return DBResponse([], error)
+        todo = index.remove(todo_id)
+        if todo is None:
+            return DBResponse([], ID_ERROR)
+        return DBResponse([todo], self._save(index))
+
+    def get_todo(self, todo_id: int) -> DBResponse: #Look up a single to-do, the response holds it if the ID exists
+        index, error = self._load()
+        if error:
+            return DBResponse([], error)
+        todo = index.get(todo_id)
+        if todo is None:
+            return DBResponse([], ID_ERROR)
+        return DBResponse([todo], SUCCESS)
+
+    def get_todos(self, todo_ids: Iterable[int]) -> DBResponse: #Look up many to-dos with a single read, unknown IDs are skipped
+        if self._batch is not None:
+            if self._batch_error:
+                return DBResponse([], self._batch_error)
+            return DBResponse([todo for todo in map(self._batch.get, todo_ids) if todo is not None], SUCCESS)
+        todo_ids = list(todo_ids)
+        wanted = set(todo_ids)
+        try:
+            with self._db_path.open("r") as db:
+                key = file_key(os.fstat(db.fileno()))
+                timing.record("read", size=key[1])
+                columns = self._cache.load(key)
+                if columns is None:
+                    found = {todo.id: todo for todo in self._parse(db, key) if todo.id in wanted}
+                else: #Only the wanted records are rebuilt from the cached columns, not the whole list
+                    found = {
+                        todo_id: ToDo(*(column[position] for column in columns))
+                        for position, todo_id in enumerate(columns[3]) if todo_id in wanted
+                    }
+        except (OSError, ValueError, TypeError): #Catch file IO problems, wrong JSON format or malformed to-dos
+            return DBResponse([], DB_READ_ERROR)
+        return DBResponse([found[todo_id] for todo_id in todo_ids if todo_id in found], SUCCESS)
+
+    def clear_todos(self) -> DBResponse: #Remove every to-do
+        if self._batch is None: #The cleared to-dos' IDs stay used, an unreadable database is cleared all the same
+            read = self.read_todos()
+            return DBResponse([], self.write_todos([], ToDoIndex(read.todo_list).next_id).error)
+        self._batch.clear()
+        return DBResponse([], self._save(self._batch))
+
+    def compact(self) -> DBResponse: #The JSON file always holds the full state, so there is nothing to fold
+        return DBResponse([], SUCCESS)
+
+    def flush(self) -> int: #Write the open transaction's changes now and keep the transaction open
+        if self._batch is None:
+            return SUCCESS
+        error = self._commit_checked()
+        if not error:
+            self._dirty = False
+        return error
+
+    def discard(self) -> int: #Drop the open transaction's unsaved changes by reading the database again
+        if self._batch is None:
+            return SUCCESS
+        self._rollback()
+        self._begin()
+        return self._batch_error
+
+    def _begin(self) -> None: #Read the database and the version it was read at
+        with self.locked(): #No write can slip in between the two reads
+            self._batch_version = self._version()
+            read = self.read_todos()
+            next_id = self.next_id()
+        self._batch, self._batch_error, self._dirty = ToDoIndex(read.todo_list, next_id), read.error, False
+
+    def _commit_checked(self) -> int: #Write the transaction's changes unless another process wrote first
+        if not self._has_changes():
+            return SUCCESS
+        with self.locked():
+            if self._version() != self._batch_version: #Writing now would overwrite the other process's changes
+                return DB_CONFLICT_ERROR
+            error = self._commit()
+            self._batch_version = self._version()
+        return error
+
+    def _has_changes(self) -> bool:
+        return self._dirty
+
+    def version(self) -> int:
+        """Return the number of writes made to the database so far."""
+        return self._version()
+
+    @property
+    def base_version(self) -> int: #The version the open transaction's next write builds on
+        return self._batch_version
+
+    def _version(self) -> int: #Return the number of writes made to the database so far
+        try:
+            return int(self._lock_path.read_text() or 0)
+        except (OSError, ValueError): #No write has bumped the version yet
+            return 0
+
+    def _bump_version(self) -> None: #Count a write, called while holding the lock
+        try:
+            self._lock_path.write_text(str(self._version() + 1))
+        except OSError:
+            pass
+
+    def _load(self) -> Tuple[ToDoIndex, int]: #Return the indexed to-do list, from the open transaction if there is one
+        if self._batch is not None:
+            return self._batch, self._batch_error
+        read = self.read_todos()
+        return ToDoIndex(read.todo_list, self.next_id()), read.error
+
+    def _save(self, index: ToDoIndex) -> int: #Persist the indexed to-do list, or leave it for the end of the transaction
+        if index is self._batch:
+            self._dirty = True
+            return SUCCESS
+        return self.write_todos(index.todos(), index.next_id).error
+
+    def _commit(self) -> int: #Write the transaction's changes
+        if not self._dirty:
+            return SUCCESS
+        return self.write_todos(self._batch.todos(), self._batch.next_id).error
+
+    def _rollback(self) -> None: #Forget whatever the transaction left behind
+        self._dirty = False
+
+class JournalDatabaseHandler(DatabaseHandler): #Store mutations in an append-only log next to a JSON snapshot
+    COMPACT_THRESHOLD = 1024 * 1024 #Fold the journal into the snapshot once it grows past this many bytes
+    TAIL_SIZE = 4096 #Number of bytes read from the end of the journal to find the next free ID
+
+    def __init__(self, db_path: Path) -> None:
+        super().__init__(db_path) #The snapshot is a regular JSON database, so existing files keep working
+        self._journal_path = db_path.with_name(db_path.name + ".journal")
+        self._pending: List[Dict[str, Any]] = [] #Journal entries held back until the transaction ends
+
+    @timing.timed("read")
+    def read_todos(self) -> DBResponse: #Load the snapshot and replay the journal on top of it
+        read = super().read_todos()
+        if read.error:
+            return read
+        index = ToDoIndex(read.todo_list)
+        try:
+            with self._journal_path.open("r") as journal:
+                lines = journal.readlines()
+            timing.record("read", size=sum(map(len, lines)))
+        except FileNotFoundError: #No mutations since the last compaction
+            return DBResponse(read.todo_list, SUCCESS)
+        except OSError:
+            return DBResponse([], DB_READ_ERROR)
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                if line is lines[-1] and not line.endswith("\n"): #A torn final line means the process died mid-append, the operation never happened
+                    break
+                return DBResponse([], DB_READ_ERROR)
+            try:
+                _replay(index, entry)
+            except (KeyError, TypeError, ValueError):
+                return DBResponse([], DB_READ_ERROR)
+        return DBResponse(index.todos(), SUCCESS)
+
+    def get_todos(self, todo_ids: Iterable[int]) -> DBResponse: #The journal has to be replayed, so the whole list is read
+        if self._batch is not None:
+            return super().get_todos(todo_ids)
+        read = self.read_todos()
+        if read.error:
+            return DBResponse([], read.error)
+        todo_ids = list(todo_ids)
+        wanted = set(todo_ids)
+        found = {todo.id: todo for todo in read.todo_list if todo.id in wanted}
+        return DBResponse([found[todo_id] for todo_id in todo_ids if todo_id in found], SUCCESS)
+
+    def write_todos(self, todo_list: List[ToDo], next_id: int = 1) -> DBResponse: #Write a fresh snapshot, which makes the journal obsolete
+        write = super().write_todos(todo_list, max(next_id, self.next_id())) #The journal's counter moves into the snapshot's
+        if write.error:
+            return write
+        try:
+            self._journal_path.unlink(missing_ok=True)
+        except OSError:
+            return DBResponse(todo_list, DB_WRITE_ERROR)
+        return write
+
+    def iter_todos(self) -> Iterator[ToDo]: #The journal has to be replayed, so the list is built first
+        if self._batch is not None:
+            yield from self._batch.todos()
+            return
+        read = self.read_todos()
+        if read.error:
+            raise ValueError(f"cannot replay {self._journal_path}")
+        yield from read.todo_list
+
+    def stream_todos(self) -> Iterator[ToDo]: #Replaying the journal needs the whole list anyway
+        return self.iter_todos()
+
+    def files_key(self) -> str: #The snapshot and the journal replayed on top of it
+        return _files_key(self._db_path, self._journal_path)
+
+    def add_todos(self, todos: List[ToDo]) -> DBResponse: #Adding only needs the next free ID, not the current list
+        if self._batch is not None:
+            index, error = self._batch, self._batch_error
+            next_id = index.next_id
+        else:
+            index, error = None, SUCCESS
+            next_id = self._next_id()
+            if next_id is None:
+                error = DB_READ_ERROR
+        if error:
+            return DBResponse(todos, error)
+        entries = []
+        for todo in todos:
+            if todo.id is None:
+                todo.id = next_id
+            next_id = max(next_id, todo.id + 1)
+            if index is not None: #Keep the transaction's list up to date for later operations
+                index.add(todo)
+            entries.append({"op": "add", "todo": todo, "next": next_id}) #Every entry records the next free ID for later appends
+        return DBResponse(todos, self._append(entries))
+
+    def complete_todo(self, todo_id: int) -> DBResponse:
+        index, error = self._load() #Read the current state to validate the ID
+        if error:
+            return DBResponse([], error)
+        todo = index.get(todo_id)
+        if todo is None:
+            return DBResponse([], ID_ERROR)
+        was_done, todo.done = todo.done, True
+        error = self._append([{"op": "complete", "id": todo_id, "next": index.next_id}])
+        return DBResponse([todo], error, not was_done)
+
+    def remove_todo(self, todo_id: int) -> DBResponse:
+        index, error = self._load() #Read the current state to validate the ID
+        if error:
+            return DBResponse([], error)
+        todo = index.remove(todo_id)
+        if todo is None:
+            return DBResponse([], ID_ERROR)
+        error = self._append([{"op": "remove", "id": todo_id, "next": index.next_id}])
+        return DBResponse([todo], error)
+
+    def clear_todos(self) -> DBResponse:
+        if self._batch is None: #An empty snapshot makes the whole journal obsolete
+            return super().clear_todos()
+        self._batch.clear()
+        return DBResponse([], self._append([{"op": "clear", "next": self._batch.next_id}]))
+
+    def compact(self) -> DBResponse: #Fold the journal into a new snapshot
+        read = self.read_todos()
+        if read.error:
+            return read
+        return self.write_todos(read.todo_list)
+
+    def _commit(self) -> int: #The transaction's operations go to the journal in a single append
+        entries, self._pending = self._pending, []
+        if not entries:
+            return SUCCESS
+        return self._write_entries(entries)
+
+    def _rollback(self) -> None:
+        self._pending = []
+
+    def _has_changes(self) -> bool:
+        return bool(self._pending)
+
+    def next_id(self) -> int: #The journal's last entry holds the newest counter, the snapshot's sidecar the one before it
+        return max(self._tail_next_id() or 1, super().next_id())
+
+    def _tail_next_id(self) -> Optional[int]: #Return the next free ID from the journal's last entry, None if there is none
+        try:
+            with self._journal_path.open("rb") as journal:
+                journal.seek(0, os.SEEK_END)
+                journal.seek(max(0, journal.tell() - self.TAIL_SIZE))
+                tail = journal.read().splitlines()
+        except OSError:
+            return None
+        for line in reversed(tail): #The first line of the tail may be cut off
+            try:
+                return json.loads(line)["next"]
+            except (ValueError, KeyError, TypeError):
+                continue
+        return None
+
+    def _next_id(self) -> Optional[int]: #Return the next free ID for an append, or None if the database can't be read
+        next_id = self._tail_next_id()
+        if next_id is not None:
+            return max(next_id, super().next_id())
+        read = self.read_todos() #Fall back to a full read right after compaction or for very long entries
+        if read.error:
+            return None
+        return ToDoIndex(read.todo_list, self.next_id()).next_id
+
+    def _append(self, entries: List[Dict[str, Any]]) -> int: #Write operations to the end of the journal in one call
+        if self._batch is not None: #Hold the entries back until the transaction ends
+            self._pending.extend(entries)
+            return SUCCESS
+        return self._write_entries(entries)
+
+    def _drop_torn_line(self, journal: Any) -> None: #Cut off a final line left by a crash mid-append, so the next entry starts on a line of its own
+        end = journal.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - self.TAIL_SIZE)
+            journal.seek(start)
+            chunk = journal.read(position - start)
+            if position == end and chunk.endswith(b"\n"): #The usual case, the last append finished
+                return
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                journal.truncate(start + newline + 1)
+                return
+            position = start
+        journal.truncate(0) #The only line is torn
+
+    @timing.timed("write")
+    def _write_entries(self, entries: List[Dict[str, Any]]) -> int:
+        try:
+            with self._journal_path.open("a+b") as journal:
+                self._drop_torn_line(journal)
+                text = "".join(json.dumps(entry, default=_to_json) + "\n" for entry in entries).encode()
+                journal.write(text)
+                timing.record("write", size=len(text))
+                journal.flush()
+                if self.fsync != "off":
+                    os.fsync(journal.fileno())
+            size = self._journal_path.stat().st_size
+        except OSError:
+            return DB_WRITE_ERROR
+        self._bump_version()
+        if size > self.COMPACT_THRESHOLD: #Compact automatically so replaying stays cheap
+            return self.compact().error
+        return SUCCESS
+
+class SqliteDatabaseHandler(DatabaseHandler): #Store one to-do per row in an indexed SQLite table
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS todos (
+            id INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0,
+            due TEXT,
+            repeat TEXT
+        );
+        CREATE INDEX IF NOT EXISTS todos_priority ON todos (priority);
+        CREATE INDEX IF NOT EXISTS todos_done ON todos (done);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    """ #The id column holds the stable to-do ID, so lookups go through the primary key,
+        #meta holds next_id once removed to-dos took the highest IDs with them
+    SCHEMA_VERSION = 1 #Kept in PRAGMA user_version, version 1 added the due and repeat columns
+    CHEAP_LOOKUP = True #get_todo goes through the primary key
+    INSERT = "INSERT INTO todos (id, description, priority, done, due, repeat) VALUES (?, ?, ?, ?, ?, ?)"
+    NEXT_ID = "SELECT MAX(COALESCE((SELECT MAX(id) FROM todos), 0) + 1, COALESCE((SELECT value FROM meta WHERE key = 'next_id'), 1))"
+    SET_NEXT_ID = (
+        "INSERT INTO meta (key, value) VALUES ('next_id', ?) ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)"
+    ) #The counter only ever moves up
+
+    def __init__(self, db_path: Path) -> None:
+        super().__init__(db_path)
+        self._connection: Optional[sqlite3.Connection] = None #The connection shared by the open transaction
+
+    def _connect(self) -> sqlite3.Connection: #Open the database file and make sure the table and indexes exist
+        connection = sqlite3.connect(self._db_path)
+        connection.executescript(self.SCHEMA)
+        if connection.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION: #Tables created before due dates existed
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(todos)")}
+            for column in ("due", "repeat"):
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE todos ADD COLUMN {column} TEXT")
+            connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            connection.commit()
+        return connection
+
+    @contextmanager
+    def _session(self) -> Iterator[sqlite3.Connection]: #Use the open transaction's connection, or a new one that commits on exit
+        if self._connection is not None:
+            yield self._connection
+            return
+        with closing(self._connect()) as connection, connection: #The inner context manager commits or rolls back
+            yield connection
+
+    @contextmanager
+    def transaction(self, hold_lock: bool = True) -> Iterator[Transaction]: #SQLite batches the operations in a real database transaction
+        transaction = Transaction()
+        if self._connection is not None:
+            yield transaction
+            return
+        try:
+            connection = self._connect()
+        except sqlite3.Error:
+            connection = None
+            transaction.error = DB_READ_ERROR
+        if connection is None: #Operations inside the block open their own connections and report the error
+            yield transaction
+            return
+        self._connection = connection
+        self._batch_version = self._version()
+        try:
+            with self.locked() if hold_lock else nullcontext(): #SQLite's own locks keep sessions safe
+                with connection: #Commits if the with block succeeds, rolls back otherwise
+                    yield transaction
+                    wrote = connection.in_transaction #SQLite only opens a transaction for writes
+                if wrote:
+                    self._bump_version()
+                    self._batch_version = self._version()
+        except sqlite3.Error:
+            transaction.error = DB_WRITE_ERROR
+        finally:
+            self._connection = None
+            connection.close()
+
+    @timing.timed("read")
+    def read_todos(self) -> DBResponse:
+        try:
+            return DBResponse(list(self.iter_todos()), SUCCESS)
+        except ValueError: #Catch missing or malformed database files
+            return DBResponse([], DB_READ_ERROR)
+
+    def write_todos(self, todo_list: List[ToDo], next_id: int = 1) -> DBResponse:
+        return DBResponse(todo_list, self.load_todos(todo_list, next_id).error)
+
+    def next_id(self) -> int:
+        try:
+            with self._session() as connection:
+                return connection.execute(self.NEXT_ID).fetchone()[0]
+        except sqlite3.Error: #The operation itself will report the unusable database
+            return 1
+
+    def iter_todos(self) -> Iterator[ToDo]: #Rows are fetched from the cursor as they are consumed
+        try:
+            with self._session() as connection:
+                rows = connection.execute(
+                    "SELECT id, description, priority, done, due, repeat FROM todos ORDER BY id"
+                )
+                for id, description, priority, done, due, repeat in rows:
+                    yield ToDo(description, priority, bool(done), id, due, repeat)
+        except sqlite3.Error as error: #Report SQLite problems like the other engines report bad files
+            raise ValueError(str(error)) from error
+
+    def stream_todos(self) -> Iterator[ToDo]: #The cursor already streams
+        return self.iter_todos()
+
+    @timing.timed("write")
+    def load_todos(self, todos: Iterable[ToDo], next_id: int = 1) -> DBResponse: #Insert the to-dos in one transaction
+        try:
+            with self._session() as connection:
+                connection.execute(self.SET_NEXT_ID, (connection.execute(self.NEXT_ID).fetchone()[0],)) #IDs handed out before stay used
+                connection.execute("DELETE FROM todos")
+                connection.executemany(self.INSERT, self._rows(todos, next_id))
+                connection.execute(self.SET_NEXT_ID, (next_id,))
+            self._written()
+            return DBResponse([], SUCCESS)
+        except sqlite3.Error:
+            return DBResponse([], DB_WRITE_ERROR)
+
+    @timing.timed("write")
+    def add_todos(self, todos: List[ToDo]) -> DBResponse: #Insert many rows in one transaction
+        try:
+            with self._session() as connection:
+                (next_id,) = connection.execute(self.NEXT_ID).fetchone()
+                connection.executemany(self.INSERT, self._rows(todos, next_id))
+            self._written()
+            return DBResponse(todos, SUCCESS)
+        except sqlite3.Error:
+            return DBResponse(todos, DB_WRITE_ERROR)
+
+    @timing.timed("write")
+    def complete_todo(self, todo_id: int) -> DBResponse: #Update a single row instead of rewriting the table
+        try:
+            with self._session() as connection:
+                todo = self._find_todo(connection, todo_id)
+                if todo is None:
+                    return DBResponse([], ID_ERROR)
+                connection.execute("UPDATE todos SET done = 1 WHERE id = ?", (todo_id,))
+            self._written()
+        except sqlite3.Error:
+            return DBResponse([], DB_WRITE_ERROR)
+        was_done, todo.done = todo.done, True
+        return DBResponse([todo], SUCCESS, not was_done)
+
+    @timing.timed("write")
+    def remove_todo(self, todo_id: int) -> DBResponse: #Delete a single row instead of rewriting the table
+        try:
+            with self._session() as connection:
+                todo = self._find_todo(connection, todo_id)
+                if todo is None:
+                    return DBResponse([], ID_ERROR)
+                connection.execute(self.SET_NEXT_ID, (todo_id + 1,))
+                connection.execute("DELETE FROM todos WHERE id = ?", (todo_id,))
+            self._written()
+        except sqlite3.Error:
+            return DBResponse([], DB_WRITE_ERROR)
+        return DBResponse([todo], SUCCESS)
+
+    @timing.timed("write")
+    def clear_todos(self) -> DBResponse:
+        try:
+            with self._session() as connection:
+                connection.execute(self.SET_NEXT_ID, (connection.execute(self.NEXT_ID).fetchone()[0],))
+                connection.execute("DELETE FROM todos")
+            self._written()
+            return DBResponse([], SUCCESS)
+        except sqlite3.Error:
+            return DBResponse([], DB_WRITE_ERROR)
+
+    def flush(self) -> int:
+        if self._connection is None:
+            return SUCCESS
+        wrote = self._connection.in_transaction
+        try:
+            self._connection.commit()
+        except sqlite3.Error:
+            return DB_WRITE_ERROR
+        if wrote:
+            self._bump_version()
+            self._batch_version = self._version()
+        return SUCCESS
+
+    def discard(self) -> int:
+        if self._connection is None:
+            return SUCCESS
+        try:
+            self._connection.rollback()
+            return SUCCESS
+        except sqlite3.Error:
+            return DB_READ_ERROR
+
+    def get_todo(self, todo_id: int) -> DBResponse:
+        try:
+            with self._session() as connection:
+                todo = self._find_todo(connection, todo_id)
+        except sqlite3.Error:
+            return DBResponse([], DB_READ_ERROR)
+        if todo is None:
+            return DBResponse([], ID_ERROR)
+        return DBResponse([todo], SUCCESS)
+
+    def get_todos(self, todo_ids: Iterable[int]) -> DBResponse: #Primary key lookups in one connection
+        try:
+            with self._session() as connection:
+                todos = [self._find_todo(connection, todo_id) for todo_id in todo_ids]
+        except sqlite3.Error:
+            return DBResponse([], DB_READ_ERROR)
+        return DBResponse([todo for todo in todos if todo is not None], SUCCESS)
+
+    def _written(self) -> None: #Count a write, writes inside a transaction are counted when it commits
+        if self._connection is None:
+            self._bump_version()
+
+    @staticmethod
+    def _find_todo(connection: sqlite3.Connection, todo_id: int) -> Optional[ToDo]: #Primary key lookup, None for invalid IDs
+        try:
+            row = connection.execute(
+                "SELECT description, priority, done, due, repeat FROM todos WHERE id = ?", (todo_id,)
+            ).fetchone()
+        except OverflowError: #Too big for an SQLite integer, so no row can have it
+            return None
+        return None if row is None else ToDo(row[0], row[1], bool(row[2]), todo_id, row[3], row[4])
+
+    @staticmethod
+    def _rows(todos: Iterable[ToDo], next_id: int) -> Iterator[tuple]: #Turn records into rows, giving new to-dos the next free ID
+        for todo in todos:
+            if todo.id is None:
+                todo.id = next_id
+            next_id = max(next_id, todo.id + 1)
+            yield (todo.id, todo.description, todo.priority, todo.done, todo.due, todo.repeat)
+
+class RecordDatabaseHandler(DatabaseHandler): #Store fixed-width records in one file and the descriptions in a heap file next to it
+    MAGIC = b"CTDR" #Identifies a record store file
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHQ") #Magic, format version, heap generation, next free ID
+    RECORD = struct.Struct("<QBBHQI") #ID, priority, flags, due day, description offset and length in the heap
+    FLAGS_OFFSET = 9 #Position of the flags byte inside a record
+    DONE, REMOVED = 1, 2 #Flag bits, removed records stay in the file until the next compaction
+    CHEAP_LOOKUP = True #get_todo bisects the mapped records
+    REPEAT_SHIFT = 2 #Bits 2 and 3 of the flags hold the position in REPEATS of a recurring to-do
+    REPEATS = (None,) + REPEATS #Files written before due dates existed have zeros there, which reads as no due date and no repeat
+
+    def __init__(self, db_path: Path) -> None:
+        super().__init__(db_path)
+        self._pending: List[Tuple[str, Any]] = [] #Operations held back until the transaction ends
+
+    @timing.timed("read")
+    def read_todos(self) -> DBResponse:
+        try:
+            return DBResponse(list(self.iter_todos()), SUCCESS)
+        except (OSError, ValueError): #Catch missing or malformed database files
+            return DBResponse([], DB_READ_ERROR)
+
+    @timing.timed("write")
+    def write_todos(self, todo_list: List[ToDo], next_id: int = 1) -> DBResponse: #Rewrite both files, dropping removed records and unused heap space
+        todo_list = sorted(_number_todos(todo_list), key=lambda todo: todo.id) #Records are kept in ID order so lookups can bisect
+        heap, records, offset = [], [], 0
+        for todo in todo_list:
+            description = todo.description.encode()
+            heap.append(description)
+            records.append(self._pack(todo, offset, len(description)))
+            offset += len(description)
+        try:
+            with self._db_path.open("rb") as db:
+                old_generation, old_next_id = self._read_header(db.read(self.HEADER.size))
+        except (OSError, ValueError): #A new or unreadable store is replaced as a whole
+            old_generation, old_next_id = None, 1
+        next_id = max(todo_list[-1].id + 1 if todo_list else 1, next_id, old_next_id) #The header keeps the counter of removed to-dos
+        generation = 0 if old_generation is None else (old_generation + 1) % 0x10000
+        try:
+            with _atomic_file(self._heap_path(generation), "wb", self.fsync) as heap_file: #A new heap, the old records still point to the old one
+                heap_file.write(b"".join(heap))
+            with _atomic_file(self._db_path, "wb", self.fsync) as db: #Switching to the new records is the commit point
+                db.write(self.HEADER.pack(self.MAGIC, self.VERSION, generation, next_id) + b"".join(records))
+            timing.record("write", size=offset + self.HEADER.size + len(records) * self.RECORD.size)
+        except OSError:
+            return DBResponse(todo_list, DB_WRITE_ERROR)
+        self._bump_version()
+        if old_generation is not None and old_generation != generation:
+            self._heap_path(old_generation).unlink(missing_ok=True)
+        return DBResponse(todo_list, SUCCESS)
+
+    def iter_todos(self) -> Iterator[ToDo]: #Scan the mapped records, decoding only the live ones
+        if self._batch is not None:
+            yield from self._batch.todos()
+            return
+        with self._map() as (records, heap, end):
+            timing.record("read", size=end + len(heap))
+            for position in range(self.HEADER.size, end, self.RECORD.size):
+                id, priority, flags, due, offset, length = self.RECORD.unpack_from(records, position)
+                if not flags & self.REMOVED:
+                    yield self._todo(heap[offset:offset + length].decode(), id, priority, flags, due)
+
+    def stream_todos(self) -> Iterator[ToDo]: #The mapped files already stream
+        return self.iter_todos()
+
+    def files_key(self) -> str: #The records and the heap they point into
+        try:
+            with self._db_path.open("rb") as db:
+                generation = self._read_header(db.read(self.HEADER.size))[0]
+        except (OSError, ValueError):
+            generation = 0
+        return _files_key(self._db_path, self._heap_path(generation))
+
+    def next_id(self) -> int: #The header's counter, appends and rewrites keep it
+        try:
+            with self._db_path.open("rb") as db:
+                return self._read_header(db.read(self.HEADER.size))[1]
+        except (OSError, ValueError):
+            return 1
+
+    def add_todos(self, todos: List[ToDo]) -> DBResponse: #Append to both files instead of rewriting them
+        if self._batch is not None:
+            if self._batch_error:
+                return DBResponse(todos, self._batch_error)
+            for todo in todos:
+                self._batch.add(todo)
+            self._pending.extend(("add", todo) for todo in todos)
+            return DBResponse(todos, SUCCESS)
+        return DBResponse(todos, self._append(todos))
+
+    def complete_todo(self, todo_id: int) -> DBResponse: #Patch the record's flags byte in place
+        if self._batch is not None:
+            todo = self._batch.get(todo_id)
+            if todo is None:
+                return DBResponse([], self._batch_error or ID_ERROR)
+            was_done, todo.done = todo.done, True
+            self._pending.append(("complete", todo_id))
+            return DBResponse([todo], SUCCESS, not was_done)
+        return self._set_flag(todo_id, self.DONE)
+
+    def remove_todo(self, todo_id: int) -> DBResponse: #Mark the record as removed in place
+        if self._batch is not None:
+            todo = self._batch.remove(todo_id)
+            if todo is None:
+                return DBResponse([], self._batch_error or ID_ERROR)
+            self._pending.append(("remove", todo_id))
+            return DBResponse([todo], SUCCESS)
+        return self._set_flag(todo_id, self.REMOVED)
+
+    def get_todo(self, todo_id: int) -> DBResponse:
+        if self._batch is not None:
+            return super().get_todo(todo_id)
+        read = self.get_todos([todo_id])
+        if not read.error and not read.todo_list:
+            return DBResponse([], ID_ERROR)
+        return read
+
+    def get_todos(self, todo_ids: Iterable[int]) -> DBResponse: #Bisect once per ID instead of scanning the records
+        if self._batch is not None:
+            return super().get_todos(todo_ids)
+        todos = []
+        try:
+            with self._map() as (records, heap, end):
+                for todo_id in todo_ids:
+                    position = self._find(records, end, todo_id)
+                    if position is not None:
+                        _, priority, flags, due, offset, length = self.RECORD.unpack_from(records, position)
+                        todos.append(self._todo(heap[offset:offset + length].decode(), todo_id, priority, flags, due))
+        except (OSError, ValueError):
+            return DBResponse([], DB_READ_ERROR)
+        return DBResponse(todos, SUCCESS)
+
+    def clear_todos(self) -> DBResponse:
+        if self._batch is not None:
+            self._batch.clear()
+            self._pending.append(("clear", None))
+            return DBResponse([], SUCCESS)
+        return DBResponse([], self.write_todos([]).error)
+
+    def compact(self) -> DBResponse: #Rewrite the files without removed records and their descriptions
+        read = self.read_todos()
+        if read.error:
+            return read
+        return self.write_todos(read.todo_list)
+
+    def _commit(self) -> int: #Apply the transaction's operations to the files
+        entries, self._pending = self._pending, []
+        if not entries:
+            return SUCCESS
+        if any(op == "clear" for op, _ in entries): #Clearing replaces everything, so write the final state once
+            return self.write_todos(self._batch.todos(), self._batch.next_id).error
+        error = self._append([todo for op, todo in entries if op == "add"]) #Added to-dos only get new IDs, so they can go first
+        for op, todo_id in entries:
+            if error:
+                break
+            if op != "add":
+                error = self._set_flag(todo_id, self.DONE if op == "complete" else self.REMOVED).error
+        return error
+
+    def _rollback(self) -> None:
+        self._pending = []
+
+    def _has_changes(self) -> bool:
+        return bool(self._pending)
+
+    @timing.timed("write")
+    def _append(self, todos: List[ToDo]) -> int: #Write new records and descriptions to the end of the files
+        if not todos:
+            return SUCCESS
+        try:
+            with self._db_path.open("r+b") as db:
+                generation, next_id = self._read_header(db.read(self.HEADER.size))
+                end = self._end(os.fstat(db.fileno()).st_size)
+                if end > self.HEADER.size: #A crash may have appended records without updating the header
+                    db.seek(end - self.RECORD.size)
+                    next_id = max(next_id, self.RECORD.unpack(db.read(self.RECORD.size))[0] + 1)
+                with self._heap_path(generation).open("ab") as heap:
+                    offset, records, descriptions = heap.tell(), [], []
+                    descriptions_start = offset
+                    for todo in todos:
+                        if todo.id is None:
+                            todo.id = next_id
+                        next_id = max(next_id, todo.id + 1)
+                        description = todo.description.encode()
+                        descriptions.append(description)
+                        records.append(self._pack(todo, offset, len(description)))
+                        offset += len(description)
+                    heap.write(b"".join(descriptions))
+                    heap.flush()
+                    if self.fsync != "off": #The descriptions must be on disk before records point at them
+                        os.fsync(heap.fileno())
+                db.truncate(end) #Drop a partial record left by a crash
+                db.seek(end)
+                db.write(b"".join(records))
+                db.seek(0)
+                db.write(self.HEADER.pack(self.MAGIC, self.VERSION, generation, next_id))
+                timing.record("write", size=offset - descriptions_start + len(records) * self.RECORD.size + self.HEADER.size)
+                db.flush()
+                if self.fsync != "off":
+                    os.fsync(db.fileno())
+        except (OSError, ValueError, struct.error):
+            return DB_WRITE_ERROR
+        self._bump_version()
+        return SUCCESS
+
+    @timing.timed("write")
+    def _set_flag(self, todo_id: int, flag: int) -> DBResponse: #Set one flag bit of a record through a writable mapping
+        try:
+            with self._db_path.open("r+b") as db, mmap.mmap(db.fileno(), 0) as records:
+                generation, _ = self._read_header(records)
+                position = self._find(records, self._end(len(records)), todo_id)
+                if position is None:
+                    return DBResponse([], ID_ERROR)
+                old_flags = records[position + self.FLAGS_OFFSET]
+                records[position + self.FLAGS_OFFSET] |= flag #A single byte changes, the rest of the file is untouched
+                timing.record("write", size=1)
+                _, priority, flags, due, offset, length = self.RECORD.unpack_from(records, position)
+                if self.fsync != "off":
+                    records.flush()
+            with self._heap_path(generation).open("rb") as heap:
+                heap.seek(offset)
+                description = heap.read(length).decode()
+        except (OSError, ValueError):
+            return DBResponse([], DB_WRITE_ERROR)
+        self._bump_version()
+        return DBResponse([self._todo(description, todo_id, priority, flags, due)], SUCCESS, not old_flags & flag)
+
+    def _find(self, records: mmap.mmap, end: int, todo_id: int) -> Optional[int]: #Bisect the ID-ordered records, None for invalid or removed IDs
+        low, high = 0, (end - self.HEADER.size) // self.RECORD.size
+        while low < high:
+            middle = (low + high) // 2
+            position = self.HEADER.size + middle * self.RECORD.size
+            id, _, flags, _, _, _ = self.RECORD.unpack_from(records, position)
+            if id < todo_id:
+                low = middle + 1
+            elif id > todo_id:
+                high = middle
+            else:
+                return None if flags & self.REMOVED else position
+        return None
+
+    def _read_header(self, header: Any) -> Tuple[int, int]: #Return the heap generation and next free ID, raise ValueError for files that aren't record stores
+        if len(header) < self.HEADER.size:
+            raise ValueError(f"{self._db_path} has no header")
+        magic, version, generation, next_id = self.HEADER.unpack_from(header)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"{self._db_path} is not a record store")
+        return generation, next_id
+
+    def _end(self, size: int) -> int: #Return where the last whole record ends, ignoring a record cut off by a crash
+        return size - (size - self.HEADER.size) % self.RECORD.size
+
+    def _heap_path(self, generation: int) -> Path: #Each full rewrite gets a new heap file, so the records file can be swapped in atomically
+        suffix = ".heap" if generation == 0 else f".heap.{generation}"
+        return self._db_path.with_name(self._db_path.name + suffix)
+
+    @contextmanager
+    def _map(self) -> Iterator[Tuple[Any, Any, int]]: #Map the records and their heap read-only, yield them with the end of the last whole record
+        with self._db_path.open("rb") as db:
+            records = mmap.mmap(db.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(db.fileno()).st_size else b""
+        try:
+            generation, _ = self._read_header(records)
+            with self._heap_path(generation).open("rb") as heap_file:
+                heap = mmap.mmap(heap_file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(heap_file.fileno()).st_size else b"" #Empty files can't be mapped
+            try:
+                yield records, heap, self._end(len(records))
+            finally:
+                if heap:
+                    heap.close()
+        finally:
+            if records:
+                records.close()
+
+    def _pack(self, todo: ToDo, offset: int, length: int) -> bytes:
+        flags = (self.DONE if todo.done else 0) | self.REPEATS.index(todo.repeat) << self.REPEAT_SHIFT
+        due = date.fromisoformat(todo.due).toordinal() - DUE_EPOCH if todo.due else 0
+        return self.RECORD.pack(todo.id, todo.priority, flags, due, offset, length)
+
+    def _todo(self, description: str, todo_id: int, priority: int, flags: int, due: int) -> ToDo: #Decode a record's fields
+        return ToDo(
+            description,
+            priority,
+            bool(flags & self.DONE),
+            todo_id,
+            date.fromordinal(DUE_EPOCH + due).isoformat() if due else None,
+            self.REPEATS[flags >> self.REPEAT_SHIFT & 3],
+        )
+
+def _replay(index: ToDoIndex, entry: Dict[str, Any]) -> None: #Apply one journal operation to the indexed to-do list
+    #Operations that already happened are skipped: a crash between writing a snapshot and deleting
+    #the journal leaves operations that are already in the snapshot, and replaying them must be harmless
+    if entry["op"] == "add":
+        todo = ToDo.from_dict(entry["todo"])
+        if index.get(todo.id) is None:
+            index.add(todo)
+    elif entry["op"] == "complete":
+        todo = index.get(entry["id"])
+        if todo is not None:
+            todo.done = True
+    elif entry["op"] == "remove":
+        index.remove(entry["id"])
+    elif entry["op"] == "clear":
+        index.clear()
+    else:
+        raise KeyError(entry["op"])
+
+def get_database_handler(
+        db_path: Path, backend: str = DEFAULT_BACKEND, fsync: str = DEFAULT_FSYNC
+) -> DatabaseHandler:
+    """Return the database handler for the selected storage engine and fsync policy."""
+    handlers = {
+        "json": DatabaseHandler,
+        "journal": JournalDatabaseHandler,
+        "sqlite": SqliteDatabaseHandler,
+        "records": RecordDatabaseHandler,
+    }
+    handler = handlers[backend](db_path)
+    handler.fsync = fsync
+    return handler
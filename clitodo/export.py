@@ -0,0 +1,42 @@
+"""This module provides the CLI To-Do streaming export."""
+# clitodo/export.py
+
+import csv
+import io
+import json
+from typing import Iterable, TextIO
+
+from clitodo.database import ToDo
+
+EXPORT_FORMATS = ("ndjson", "csv", "json") #The formats export --format accepts
+CHUNK_SIZE = 64 * 1024 #Output is written once about this many characters are buffered
+
+def export_todos(todos: Iterable[ToDo], out: TextIO, format: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """Write the to-dos to out in bounded chunks and return how many were written.
+
+    Only one chunk of output is held at a time, so memory doesn't grow
+    with the number of to-dos.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == "csv":
+        writer.writerow(ToDo.FIELDS) #ID, Description, Priority, Done, Due, Repeat
+    elif format == "json":
+        buffer.write("[")
+    count = 0
+    for todo in todos:
+        if format == "csv":
+            writer.writerow((todo.id, todo.description, todo.priority, todo.done, todo.due or "", todo.repeat or ""))
+        elif format == "json": #A JSON array with one to-do per line
+            buffer.write(("," if count else "") + "\n    " + json.dumps(todo.to_dict()))
+        else: #One object per line
+            buffer.write(json.dumps(todo.to_dict()) + "\n")
+        count += 1
+        if buffer.tell() >= chunk_size:
+            out.write(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+    if format == "json":
+        buffer.write("\n]\n" if count else "]\n")
+    out.write(buffer.getvalue())
+    return count
@@ -0,0 +1,226 @@
+"""This module provides the CLI To-Do search and listing indexes."""
+# clitodo/search.py
+
+import heapq
+import math
+import re
+import sqlite3 #The index is a SQLite table, so a query only reads the postings it needs
+from contextlib import closing
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+from clitodo.database import ToDo
+
+TOKEN = re.compile(r"\w+") #Words are runs of letters, digits and underscores
+PREFIX_WEIGHT = 0.5 #A word that only starts with a query term counts half as much as an exact match
+CANDIDATE_LIMIT = 5000 #Below this many candidates, later query words are looked up by to-do ID
+SCHEMA_VERSION = 4 #Bump whenever the tables change, older index files are then rebuilt
+SORT_KEYS = {"id": "id", "priority": "priority, id"} #The orders list --sort accepts, ties go by ID
+State = Tuple[int, str] #The database version from the lock file and the files key of DatabaseHandler.files_key()
+
+def _prefix_range(word: str) -> Tuple[str, str]: #Every term starting with word sorts inside this half-open range
+    return word, word[:-1] + chr(ord(word[-1]) + 1)
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase words."""
+    return TOKEN.findall(text.lower())
+
+class SearchIndex: #Indexes over the to-do list, stored next to the database
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            PRIMARY KEY (term, id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS postings_id ON postings (id);
+        CREATE TABLE IF NOT EXISTS fields (
+            id INTEGER PRIMARY KEY,
+            priority INTEGER NOT NULL,
+            done INTEGER NOT NULL,
+            due TEXT
+        );
+        CREATE INDEX IF NOT EXISTS fields_priority ON fields (priority, done);
+        CREATE INDEX IF NOT EXISTS fields_done ON fields (done, priority);
+        CREATE INDEX IF NOT EXISTS fields_due ON fields (done, due) WHERE due IS NOT NULL;
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value NOT NULL);
+    """ #postings is the inverted index of description words: its primary key serves exact and prefix lookups, postings_id serves removals
+        #fields holds the priority buckets and the pending/done split, each index ends in the rowid so buckets come out in ID order,
+        #fields_due keeps the to-dos with a due date sorted by it, so due soon queries read only the front of the index
+
+    def __init__(self, db_path: Path) -> None:
+        self._path = db_path.with_name(db_path.name + ".search")
+
+    def state(self) -> Optional[State]: #Return the database version and files key the index reflects, None if there is no usable index
+        if not self._path.exists():
+            return None
+        try:
+            with closing(self._connect()) as connection:
+                return self._state(connection)
+        except sqlite3.Error:
+            return None
+
+    def rebuild(self, todos: Iterable[ToDo], state: State) -> None:
+        """Index every to-do from scratch."""
+        self._path.unlink(missing_ok=True)
+        fields = []
+        def postings(): #Collects the fields while generating the postings, so the to-dos are only iterated once
+            for todo in todos:
+                fields.append((todo.id, todo.priority, todo.done, todo.due))
+                for term in set(tokenize(todo.description)):
+                    yield term, todo.id
+        with closing(self._connect()) as connection, connection:
+            connection.executemany("INSERT INTO postings VALUES (?, ?)", postings())
+            connection.executemany("INSERT OR REPLACE INTO fields VALUES (?, ?, ?, ?)", fields)
+            self._set(connection, "documents", len(fields))
+            self._set(connection, "schema", SCHEMA_VERSION)
+            self._set_state(connection, state)
+
+    def update(self, operations: List[Tuple[str, object]], base_state: State, state: State) -> None:
+        """Apply ("add", todo), ("complete", id), ("remove", id) and ("clear", None) operations.
+
+        They are only applied if the index reflects base_state, the
+        database version and files key they were made on. Otherwise the
+        index is left stale and the next search rebuilds it.
+        """
+        if not self._path.exists(): #Nothing to keep up to date until the first search builds the index
+            return
+        try:
+            with closing(self._connect()) as connection, connection:
+                if self._state(connection) != base_state: #Another write, or an edit outside clitodo, came first
+                    return
+                documents = self._get(connection, "documents") or 0
+                for op, argument in operations:
+                    if op == "add":
+                        connection.executemany(
+                            "INSERT OR IGNORE INTO postings VALUES (?, ?)",
+                            ((term, argument.id) for term in tokenize(argument.description)),
+                        )
+                        connection.execute(
+                            "INSERT OR REPLACE INTO fields VALUES (?, ?, ?, ?)",
+                            (argument.id, argument.priority, argument.done, argument.due),
+                        )
+                        documents += 1
+                    elif op == "complete":
+                        connection.execute("UPDATE fields SET done = 1 WHERE id = ?", (argument,))
+                    elif op == "remove":
+                        connection.execute("DELETE FROM postings WHERE id = ?", (argument,))
+                        connection.execute("DELETE FROM fields WHERE id = ?", (argument,))
+                        documents -= 1
+                    else:
+                        connection.execute("DELETE FROM postings")
+                        connection.execute("DELETE FROM fields")
+                        documents = 0
+                self._set(connection, "documents", max(documents, 0))
+                self._set_state(connection, state)
+        except sqlite3.Error: #A damaged index is dropped and rebuilt by the next search
+            self._path.unlink(missing_ok=True)
+
+    def search(self, terms: List[str], limit: int) -> List[Tuple[int, float]]:
+        """Return up to limit (ID, score) pairs of the to-dos matching every term, best first."""
+        words = {word for term in terms for word in tokenize(term)}
+        if not words:
+            return []
+        with closing(self._connect()) as connection:
+            documents = self._get(connection, "documents") or 1
+            counts = {word: self._count(connection, "term >= ? AND term < ?", _prefix_range(word)) for word in words}
+            scores: Optional[dict] = None
+            for word in sorted(words, key=counts.get): #Start with the rarest word, so later words only check a few candidates
+                matches = self._match(connection, word, documents, scores)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {todo_id: score + matches[todo_id] for todo_id, score in scores.items() if todo_id in matches}
+                if not scores:
+                    return []
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def query(
+            self,
+            priority: Optional[int] = None,
+            done: Optional[bool] = None,
+            sort: str = "id",
+            reverse: bool = False,
+            offset: int = 0,
+            limit: Optional[int] = None,
+    ) -> List[int]:
+        """Return the IDs of the to-dos with this priority and done state, in sort order."""
+        conditions, parameters = [], []
+        if priority is not None:
+            conditions.append("priority = ?")
+            parameters.append(priority)
+        if done is not None:
+            conditions.append("done = ?")
+            parameters.append(int(done))
+        order = ", ".join(
+            f"{column} DESC" if reverse else column for column in SORT_KEYS[sort].split(", ")
+        )
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with closing(self._connect()) as connection: #SQLite walks only the matching bucket of fields_priority or fields_done
+            rows = connection.execute(
+                f"SELECT id FROM fields {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                (*parameters, -1 if limit is None else limit, offset),
+            )
+            return [todo_id for (todo_id,) in rows]
+
+    def due(self, until: str, limit: Optional[int] = None) -> List[int]:
+        """Return the IDs of the pending to-dos due on or before until, soonest first."""
+        with closing(self._connect()) as connection: #A range scan over fields_due, no matter how long the list is
+            rows = connection.execute(
+                "SELECT id FROM fields WHERE done = 0 AND due IS NOT NULL AND due <= ? ORDER BY due, id LIMIT ?",
+                (until, -1 if limit is None else limit),
+            )
+            return [todo_id for (todo_id,) in rows]
+
+    def _match(
+            self, connection: sqlite3.Connection, word: str, documents: int, candidates: Optional[dict]
+    ) -> dict: #Score the to-dos containing a word starting with word, among the candidates if there are any
+        if candidates is None or len(candidates) > CANDIDATE_LIMIT:
+            rows = connection.execute(
+                "SELECT term, id FROM postings WHERE term >= ? AND term < ?", _prefix_range(word)
+            ).fetchall()
+        else: #Look the candidates up by ID instead of reading every posting of a common word
+            rows = []
+            ids = list(candidates)
+            for start in range(0, len(ids), 500): #Stay below SQLite's limit on query parameters
+                chunk = ids[start:start + 500]
+                rows += connection.execute(
+                    f"SELECT term, id FROM postings WHERE id IN ({', '.join('?' * len(chunk))}) AND term >= ? AND term < ?",
+                    (*chunk, *_prefix_range(word)),
+                ).fetchall()
+        frequencies = {term: self._count(connection, "term = ?", (term,)) for term in {term for term, _ in rows}}
+        matches: dict = {}
+        for term, todo_id in rows:
+            weight = math.log(1 + documents / frequencies[term]) #Rare words rank higher than common ones
+            if term != word:
+                weight *= PREFIX_WEIGHT
+            if weight > matches.get(todo_id, 0):
+                matches[todo_id] = weight
+        return matches
+
+    @staticmethod
+    def _count(connection: sqlite3.Connection, condition: str, parameters: tuple) -> int: #Count postings, SQLite only walks the primary key
+        return connection.execute(f"SELECT COUNT(*) FROM postings WHERE {condition}", parameters).fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._path)
+        connection.execute("PRAGMA synchronous = OFF") #The index can always be rebuilt from the database, so it skips fsync
+        connection.executescript(self.SCHEMA)
+        return connection
+
+    def _state(self, connection: sqlite3.Connection) -> Optional[State]:
+        if self._get(connection, "schema") != SCHEMA_VERSION:
+            return None
+        return self._get(connection, "version"), self._get(connection, "files")
+
+    def _set_state(self, connection: sqlite3.Connection, state: State) -> None:
+        self._set(connection, "version", state[0])
+        self._set(connection, "files", state[1])
+
+    @staticmethod
+    def _get(connection: sqlite3.Connection, key: str) -> Optional[Union[int, str]]:
+        row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    @staticmethod
+    def _set(connection: sqlite3.Connection, key: str, value: Union[int, str]) -> None:
+        connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
@@ -0,0 +1,95 @@
+"""This module provides the CLI To-Do phase timers used by --profile and CLITODO_TRACE."""
+# clitodo/timing.py
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+STARTED = time.perf_counter() #Imported first by the entry point, so this is close to process start
+enabled = False #Timers cost nothing until --profile or CLITODO_TRACE turns them on
+
+_phases: Dict[str, List[float]] = {} #Phase name mapped to [seconds, calls, bytes]
+_stack: List[str] = [] #The running phases, only the innermost one is charged for time
+_mark = STARTED #When the time was last charged to a phase
+
+def record(name: str, seconds: float = 0.0, calls: int = 0, size: int = 0) -> None:
+    """Add time, calls and bytes to a phase."""
+    if not enabled:
+        return
+    totals = _phases.setdefault(name, [0.0, 0, 0])
+    totals[0] += seconds
+    totals[1] += calls
+    totals[2] += size
+
+def _charge() -> None: #Give the time since the last switch to the running phase
+    global _mark
+    now = time.perf_counter()
+    if _stack:
+        record(_stack[-1], now - _mark)
+    _mark = now
+
+@contextmanager
+def phase(name: str, calls: int = 1) -> Iterator[None]:
+    """Time the with block as part of a phase, minus the phases nested in it."""
+    if not enabled or (_stack and _stack[-1] == name): #A storage engine calling its parent's read_todos is still one read
+        yield
+        return
+    _charge()
+    _stack.append(name)
+    record(name, calls=calls)
+    try:
+        yield
+    finally:
+        _charge()
+        _stack.pop()
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorate a function so every call is timed as part of a phase."""
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled: #One global lookup when profiling is off
+                return function(*args, **kwargs)
+            with phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timed_iter(name: str, items: Iterable[Any]) -> Iterator[Any]:
+    """Yield from items, timing only the work of producing each one."""
+    iterator = iter(items)
+    if not enabled:
+        return iterator
+    return _timed(name, iterator)
+
+def _timed(name: str, iterator: Iterator[Any]) -> Iterator[Any]:
+    record(name, calls=1)
+    while True:
+        with phase(name, calls=0): #The consumer's time between items goes to its own phase
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def report() -> Dict[str, Any]:
+    """Return the phases and the total time since startup, in milliseconds."""
+    _charge()
+    return {
+        "total_ms": (time.perf_counter() - STARTED) * 1000,
+        "phases": {
+            name: {"ms": seconds * 1000, "calls": calls, "bytes": size}
+            for name, (seconds, calls, size) in _phases.items()
+        },
+    }
+
+def format_report(data: Dict[str, Any]) -> str:
+    """Return the report as a table, phases in the order they first ran."""
+    lines = [f"{'phase':<10}{'ms':>10}{'calls':>7}{'bytes':>12}"]
+    for name, totals in data["phases"].items():
+        lines.append(f"{name:<10}{totals['ms']:>10.2f}{totals['calls']:>7}{totals['bytes']:>12}")
+    accounted = sum(totals["ms"] for totals in data["phases"].values())
+    lines.append(f"{'other':<10}{data['total_ms'] - accounted:>10.2f}")
+    lines.append(f"{'total':<10}{data['total_ms']:>10.2f}")
+    return "\n".join(lines)
@@ -1,17 +1,35 @@
 # tests/test_clitodo.py
 
+import asyncio
 import json
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import tracemalloc
 
 import pytest
 from typer.testing import CliRunner
 
+from clitodo.aio import AsyncTodoer
+from clitodo.export import export_todos
+
 from clitodo import (
+    BACKENDS,
+    DB_CONFLICT_ERROR,
     DB_READ_ERROR,
+    DEFAULT_LIST,
+    DUE_ERROR,
+    ID_ERROR,
     SUCCESS,
     __app_name__,
     __version__,
     cli,
     clitodo,
+    config,
+    database,
+    timing,
 )
 
 runner = CliRunner()
@@ -31,11 +49,22 @@ def mock_json_file(tmp_path): #Create and return a temporary JSON file, db_file,
         json.dump(todo, db, indent=4)
     return db_file
 
+@pytest.fixture(params=BACKENDS)
+def backend(request): #Run the test once for every storage engine
+    return request.param
+
+@pytest.fixture
+def db_path(mock_json_file, backend): #Return the mock database migrated to the storage engine under test
+    path = mock_json_file.with_suffix("." + backend)
+    database.migrate_database(mock_json_file, "json", path, backend)
+    return path
+
 #Some data to create the test cases
 test_data1 = {
     "description": ["Clean", "the", "house"],
     "priority": 1,
     "todo": {
+        "ID": 2,
         "Description": "Clean the house.",
         "Priority": 1,
         "Done": False,
@@ -45,6 +74,7 @@ test_data2 = {
     "description": ["Wash the car"],
     "priority": 2,
     "todo": {
+        "ID": 2,
         "Description": "Wash the car.",
         "Priority": 2,
         "Done": False,
@@ -71,4 +101,495 @@ def test_add(mock_json_file, description, priority, expected):
     todoer = clitodo.Todoer(mock_json_file)
     assert todoer.add(description, priority) == expected
     read = todoer._db_handler.read_todos()
-    assert len(read.todo_list) == 2
\ No newline at end of file
+    assert len(read.todo_list) == 2
+
+def test_journal_replay_and_compact(mock_json_file): #The journal backend reads the existing JSON file and logs every mutation
+    todoer = clitodo.Todoer(mock_json_file, "journal")
+    assert todoer.add(test_data1["description"], test_data1["priority"]) == (test_data1["todo"], SUCCESS)
+    assert todoer.set_done(1).todo["Done"] is True
+    assert todoer.remove(2) == (test_data1["todo"], SUCCESS)
+    journal = mock_json_file.with_name(mock_json_file.name + ".journal")
+    assert len(journal.read_text().splitlines()) == 3 #Mutations are appended instead of rewriting the snapshot
+    assert json.loads(mock_json_file.read_text())[0]["Done"] is False
+    expected = [{"ID": 1, "Description": "Get some milk.", "Priority": 2, "Done": True}]
+    assert todoer.get_todo_list() == expected
+    assert todoer.compact().error == SUCCESS
+    assert not journal.exists()
+    assert json.loads(mock_json_file.read_text()) == expected
+
+def test_journal_torn_write(mock_json_file): #A line cut off by a crash is dropped before the next append
+    todoer = clitodo.Todoer(mock_json_file, "journal")
+    todoer.add(test_data1["description"], test_data1["priority"])
+    journal = mock_json_file.with_name(mock_json_file.name + ".journal")
+    with journal.open("a") as file:
+        file.write('{"op": "add", "to')
+    assert todoer.add(test_data2["description"], test_data2["priority"]).error == SUCCESS
+    assert [todo["Description"] for todo in todoer.get_todo_list()] == ["Get some milk.", "Clean the house.", "Wash the car."]
+    assert todoer.compact().error == SUCCESS
+    assert len(clitodo.Todoer(mock_json_file, "journal").get_todo_list()) == 3
+
+def test_sqlite_migrate(mock_json_file): #Stream the JSON database into SQLite and update single rows
+    db_file = mock_json_file.with_suffix(".db")
+    assert database.migrate_database(mock_json_file, "json", db_file, "sqlite") == SUCCESS
+    todoer = clitodo.Todoer(db_file, "sqlite")
+    assert todoer.add(test_data2["description"], test_data2["priority"]) == (test_data2["todo"], SUCCESS)
+    assert todoer.set_done(2).todo == dict(test_data2["todo"], Done=True)
+    assert todoer.remove(1).todo["Description"] == "Get some milk."
+    assert todoer.remove(5).error == ID_ERROR
+    assert todoer.remove(2**63).error == ID_ERROR #Past SQLite's integers
+    assert todoer.set_done(2**63).error == ID_ERROR
+    assert todoer.get_todo_list() == [dict(test_data2["todo"], Done=True)]
+
+def test_init_failure_keeps_config(mock_json_file, monkeypatch, tmp_path): #A database init can't create leaves the config file as it was
+    monkeypatch.setattr(config, "CONFIG_DIR_PATH", tmp_path)
+    monkeypatch.setattr(config, "CONFIG_FILE_PATH", tmp_path / "config.ini")
+    assert config.init_app(str(mock_json_file)) == SUCCESS
+    before = config.CONFIG_FILE_PATH.read_text()
+    result = runner.invoke(cli.app, ["init", "--db-path", str(mock_json_file), "--backend", "sqlite"])
+    assert result.exit_code == 1
+    assert "migrate" in result.stdout
+    assert config.CONFIG_FILE_PATH.read_text() == before
+
+def test_import(mock_json_file, monkeypatch): #Import plain lines from standard input with a single write
+    monkeypatch.setattr(cli, "get_todoer", lambda: clitodo.Todoer(mock_json_file))
+    result = runner.invoke(cli.app, ["import", "-p", "1"], input="Clean the house\n\nWash the car.\n")
+    assert result.exit_code == 0
+    assert "2 to-dos were imported" in result.stdout
+    todo_list = json.loads(mock_json_file.read_text())
+    assert todo_list[1:] == [test_data1["todo"], dict(test_data2["todo"], ID=3, Priority=1)]
+
+@pytest.mark.parametrize("item, message", [
+    ('{"Description": "Clean", "Priority": 7}', "to-do # 2"),
+    ('{"Description": "Clean", "Priority": 0}', "to-do # 2"), #An explicit 0 isn't replaced by the default
+    ('{"Description": null}', "item 2"),
+])
+def test_import_rejects_bad_priority(mock_json_file, monkeypatch, item, message): #A single invalid item aborts the whole import
+    monkeypatch.setattr(cli, "get_todoer", lambda: clitodo.Todoer(mock_json_file))
+    lines = '{"Description": "Wash the car"}\n' + item + '\n'
+    result = runner.invoke(cli.app, ["import", "--format", "ndjson"], input=lines)
+    assert result.exit_code == 1
+    assert message in result.stdout
+    assert len(json.loads(mock_json_file.read_text())) == 1
+
+def test_list_page(mock_json_file, monkeypatch): #Only the requested page of to-dos is printed
+    todoer = clitodo.Todoer(mock_json_file)
+    todoer.add(test_data1["description"], test_data1["priority"])
+    todoer.add(test_data2["description"], test_data2["priority"])
+    monkeypatch.setattr(cli, "get_todoer", lambda: todoer)
+    result = runner.invoke(cli.app, ["list", "--offset", "1", "--limit", "1"])
+    assert result.exit_code == 0
+    assert "2    | (1)       | False |             | Clean the house." in result.stdout
+    assert "Get some milk." not in result.stdout
+    assert "Wash the car." not in result.stdout
+
+def test_todo_record_round_trip(mock_json_file): #Records read like dictionaries and write back the same JSON
+    todo_list = clitodo.Todoer(mock_json_file).get_todo_list()
+    assert isinstance(todo_list[0], database.ToDo)
+    assert todo_list[0] == {"ID": 1, "Description": "Get some milk.", "Priority": 2, "Done": False}
+    database.DatabaseHandler(mock_json_file).write_todos(todo_list)
+    assert json.loads(mock_json_file.read_text()) == [todo_list[0].to_dict()]
+
+def test_stable_ids(mock_json_file): #Removing a to-do doesn't renumber the later ones
+    todoer = clitodo.Todoer(mock_json_file)
+    todoer.add(test_data1["description"], test_data1["priority"])
+    todoer.add(test_data2["description"], test_data2["priority"])
+    assert todoer.remove(1).error == SUCCESS
+    assert todoer.set_done(3).todo["Description"] == "Wash the car."
+    assert todoer.remove(1).error == ID_ERROR
+    assert [todo["ID"] for todo in todoer.get_todo_list()] == [2, 3]
+
+def test_hand_edited_ids(mock_json_file): #To-dos without IDs are numbered past the highest ID, bad elements are read errors
+    mock_json_file.write_text(json.dumps([
+        {"Description": "No ID.", "Priority": 2, "Done": False},
+        {"ID": 1, "Description": "First.", "Priority": 2, "Done": False},
+        {"ID": 4, "Description": "Fourth.", "Priority": 2, "Done": False},
+        {"Description": "No ID either.", "Priority": 2, "Done": False},
+    ]))
+    todoer = clitodo.Todoer(mock_json_file)
+    assert [todo["ID"] for todo in todoer.get_todo_list()] == [5, 1, 4, 6]
+    assert [todo["ID"] for todo in todoer.iter_todos()] == [5, 1, 4, 6]
+    for content in ('[{"Description": "Fine.", "Priority": 2, "Done": false}, 5]', '{"Description": "Fine.", "Priority": 2, "Done": false}'):
+        mock_json_file.write_text(content)
+        assert todoer._db_handler.read_todos().error == DB_READ_ERROR
+        with pytest.raises(ValueError):
+            list(todoer.iter_todos())
+
+def test_ids_never_reused(db_path, backend, tmp_path): #Removed and cleared IDs stay used, through compaction and migration too
+    todoer = clitodo.Todoer(db_path, backend)
+    todoer.add(test_data1["description"])
+    todoer.remove(2)
+    assert todoer.add(test_data2["description"]).todo["ID"] == 3
+    todoer.remove_all()
+    assert todoer.add(test_data2["description"]).todo["ID"] == 4
+    todoer.remove(4)
+    todoer.compact()
+    with todoer.transaction():
+        assert todoer.add(test_data1["description"]).todo["ID"] == 5
+        todoer.remove(5)
+    target_path = tmp_path / "migrated.json"
+    assert database.migrate_database(db_path, backend, target_path, "json") == SUCCESS
+    assert clitodo.Todoer(target_path).add(test_data1["description"]).todo["ID"] == 6
+
+def test_transaction(mock_json_file, monkeypatch): #A batch of operations is read and written once
+    todoer = clitodo.Todoer(mock_json_file)
+    writes = []
+    write_todos = todoer._db_handler.write_todos
+    monkeypatch.setattr(todoer._db_handler, "write_todos", lambda *args: writes.append(1) or write_todos(*args))
+    with todoer.transaction() as transaction:
+        todoer.add(test_data1["description"], test_data1["priority"])
+        todoer.add(test_data2["description"], test_data2["priority"])
+        assert todoer.set_done(3).error == SUCCESS
+        assert todoer.remove(1).error == SUCCESS
+    assert transaction.error == SUCCESS
+    assert len(writes) == 1
+    assert [(todo["ID"], todo["Done"]) for todo in todoer.get_todo_list()] == [(2, False), (3, True)]
+
+def test_remove_range(mock_json_file, monkeypatch): #Ranges are confirmed once and removed in one batch
+    todoer = clitodo.Todoer(mock_json_file)
+    todoer.add(test_data1["description"], test_data1["priority"])
+    todoer.add(test_data2["description"], test_data2["priority"])
+    monkeypatch.setattr(cli, "get_todoer", lambda: todoer)
+    result = runner.invoke(cli.app, ["remove", "1-2", "7"], input="y\n")
+    assert result.exit_code == 1 #ID 7 doesn't exist, so nothing is removed
+    assert len(todoer.get_todo_list()) == 3
+    result = runner.invoke(cli.app, ["remove", "1-2"], input="y\n")
+    assert result.exit_code == 0
+    assert result.stdout.count("Delete 2 to-dos") == 1
+    assert [todo["ID"] for todo in todoer.get_todo_list()] == [3]
+    todoer.add(test_data1["description"], test_data1["priority"])
+    result = runner.invoke(cli.app, ["complete", "1-9"]) #Removed IDs inside a range are skipped
+    assert result.exit_code == 0
+    assert all(todo.done for todo in todoer.get_todo_list())
+    result = runner.invoke(cli.app, ["remove", "-f", "2-4"])
+    assert result.exit_code == 0
+    assert [todo["ID"] for todo in todoer.get_todo_list()] == []
+    assert runner.invoke(cli.app, ["complete", "1-5"]).exit_code == 1 #Nothing left in the range
+    assert runner.invoke(cli.app, ["remove", "1-100000000"], input="y\n").exit_code == 2
+
+def test_transaction_rollback(db_path, backend): #Every storage engine discards the batch when the with block raises
+    todoer = clitodo.Todoer(db_path, backend)
+    with todoer.transaction() as transaction:
+        todoer.add(test_data1["description"], test_data1["priority"])
+        todoer.set_done(2)
+    assert transaction.error == SUCCESS
+    with pytest.raises(RuntimeError):
+        with todoer.transaction():
+            todoer.remove(1)
+            raise RuntimeError
+    assert todoer.get_todo_list() == [
+        {"ID": 1, "Description": "Get some milk.", "Priority": 2, "Done": False},
+        dict(test_data1["todo"], Done=True),
+    ]
+
+def test_shell_reads_once(mock_json_file, monkeypatch): #The shell keeps the parsed list in memory across commands
+    todoer = clitodo.Todoer(mock_json_file)
+    reads = []
+    read_todos = todoer._db_handler.read_todos
+    monkeypatch.setattr(todoer._db_handler, "read_todos", lambda: reads.append(1) or read_todos())
+    monkeypatch.setattr(cli, "get_todoer", lambda: todoer)
+    commands = "add Wash the car\ncomplete 2\ncomplete 7\nlist\nremove -f 1\nexit\n"
+    result = runner.invoke(cli.app, ["shell"], input=commands)
+    assert result.exit_code == 0
+    assert "to-do # 2 \"Wash the car.\" completed!" in result.stdout
+    assert len(reads) == 2 #The failed complete 7 re-reads the saved state
+    assert json.loads(mock_json_file.read_text()) == [dict(test_data2["todo"], Done=True)]
+
+def test_version_skips_storage(): #--version must not import the config and storage modules
+    code = (
+        "import sys; from clitodo import cli; cli.app(['--version'], standalone_mode=False);"
+        "print(sorted(set(sys.modules) & {'clitodo.config', 'clitodo.database', 'clitodo.clitodo'}))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.endswith("[]\n")
+
+def test_model_skips_process_pool(): #Only --all-lists needs worker processes
+    code = "import sys; from clitodo import clitodo; print('concurrent.futures' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout == "False\n"
+
+def test_parse_cache(mock_json_file): #Reads reuse the cache until the database file changes
+    handler = database.DatabaseHandler(mock_json_file)
+    assert handler.read_todos().todo_list[0]["Description"] == "Get some milk." #First read parses the JSON file
+    assert handler.read_todos().todo_list[0]["Description"] == "Get some milk." #Second read is a cache hit
+    assert handler.cache_stats() == (1, 1)
+    mock_json_file.write_text(json.dumps([{"Description": "Edited by hand.", "Priority": 1, "Done": True}]))
+    todo = handler.read_todos().todo_list[0] #The edit changed the file's size and mtime, so the cache is stale
+    assert (todo["ID"], todo["Description"], todo["Done"]) == (1, "Edited by hand.", True)
+    assert handler.cache_stats() == (1, 2)
+    stats_path = mock_json_file.with_name(mock_json_file.name + ".cache.stats")
+    assert stats_path.stat().st_size == 16 #Two counters rewritten in place, not one byte per load
+
+def test_record_store(mock_json_file): #complete patches one byte and the store converts back to JSON
+    db_file = mock_json_file.with_suffix(".rec")
+    assert database.migrate_database(mock_json_file, "json", db_file, "records") == SUCCESS
+    todoer = clitodo.Todoer(db_file, "records")
+    todoer.add(["Buy", "bread"], 3)
+    before = db_file.read_bytes()
+    assert todoer.set_done(1).error == SUCCESS
+    after = db_file.read_bytes()
+    assert len(before) == len(after)
+    assert sum(a != b for a, b in zip(before, after)) == 1
+    todoer.remove(2)
+    assert todoer.get_todo(2).error == ID_ERROR
+    json_file = mock_json_file.with_name("back.json")
+    assert database.migrate_database(db_file, "records", json_file, "json") == SUCCESS
+    assert json.loads(json_file.read_text()) == [
+        {"ID": 1, "Description": "Get some milk.", "Priority": 2, "Done": True},
+    ]
+
+def _add_todos(db_file, backend, count): #Runs in a separate process
+    todoer = clitodo.Todoer(db_file, backend, "off")
+    for number in range(count):
+        todoer.add([f"To-do {number}"])
+
+def test_parallel_adds(db_path, backend): #Processes writing at once don't lose each other's to-dos
+    processes, count = 4, 10
+    workers = [
+        multiprocessing.Process(target=_add_todos, args=(db_path, backend, count))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    ids = [todo["ID"] for todo in clitodo.Todoer(db_path, backend).get_todo_list()]
+    assert sorted(ids) == list(range(1, processes * count + 2))
+
+def test_session_conflict(mock_json_file): #A session that doesn't hold the lock refuses to overwrite newer changes
+    session, other = clitodo.Todoer(mock_json_file), clitodo.Todoer(mock_json_file)
+    with session.transaction(hold_lock=False) as transaction:
+        session.add(["From", "the", "session"])
+        other.add(["From", "another", "process"])
+    assert transaction.error == DB_CONFLICT_ERROR
+    assert [todo["Description"] for todo in other.get_todo_list()] == [
+        "Get some milk.", "From another process.",
+    ]
+
+def test_session_reloads_outside_writes(mock_json_file, monkeypatch): #Commands after another process's write see it instead of failing to save
+    todoer = clitodo.Todoer(mock_json_file)
+    monkeypatch.setattr(cli, "get_todoer", lambda: todoer)
+    with todoer.transaction(hold_lock=False) as transaction:
+        monkeypatch.setattr(cli, "_session_todoer", todoer)
+        assert cli._run_command(todoer, ["add", "Wash", "the", "car"]) == 0
+        clitodo.Todoer(mock_json_file).add(["From", "another", "process"])
+        assert cli._run_command(todoer, ["add", "Buy", "bread"]) == 0
+    assert transaction.error == SUCCESS
+    assert [todo["ID"] for todo in clitodo.Todoer(mock_json_file).get_todo_list()] == [1, 2, 3, 4]
+
+def test_failed_write_keeps_database(mock_json_file, monkeypatch): #A write that dies halfway leaves the old database in place
+    before = mock_json_file.read_text()
+    def crash(todo):
+        raise OSError("disk full")
+    monkeypatch.setattr(database, "_to_json", crash)
+    todoer = clitodo.Todoer(mock_json_file)
+    assert todoer.add(["Never", "saved"]).error != SUCCESS
+    assert mock_json_file.read_text() == before
+    assert list(mock_json_file.parent.glob("*.tmp")) == []
+
+def test_write_keeps_permissions(mock_json_file): #Swapping in the new file doesn't make a shared database private
+    mock_json_file.chmod(0o644)
+    clitodo.Todoer(mock_json_file).add(["Shared"])
+    assert mock_json_file.stat().st_mode & 0o777 == 0o644
+    new_file = mock_json_file.with_name("new.json")
+    umask = os.umask(0o022)
+    try:
+        assert database.init_database(new_file) == SUCCESS
+    finally:
+        os.umask(umask)
+    assert new_file.stat().st_mode & 0o777 == 0o644
+
+def test_search(db_path, backend): #The index follows adds and removals without a rebuild
+    todoer = clitodo.Todoer(db_path, backend)
+    todoer.add(["Buy", "milk", "and", "bread"])
+    assert [todo["ID"] for todo in todoer.search(["milk"]).todo_list] == [1, 2]
+    rebuild = todoer._search_index.rebuild
+    todoer._search_index.rebuild = None #Any further rebuild would fail the test
+    todoer.add(["Bake", "bread"])
+    with todoer.transaction():
+        todoer.remove(2)
+        todoer.add(["Milking", "time"])
+    assert [todo["ID"] for todo in todoer.search(["bre"]).todo_list] == [3]
+    assert [todo["ID"] for todo in todoer.search(["milk"]).todo_list] == [1, 4] #Exact matches rank above prefix matches
+    assert todoer.search(["milk", "bread"]).todo_list == []
+    todoer._search_index.rebuild = rebuild
+    database.get_database_handler(db_path, backend).add_todo(database.ToDo("Fresh milk.")) #Written behind the index's back
+    assert [todo["ID"] for todo in todoer.search(["fresh"]).todo_list] == [5]
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_index_follows_external_edits(db_path, backend): #Hand edits and restored backups don't bump the version, the files key notices
+    todoer = clitodo.Todoer(db_path, backend)
+    assert [todo["ID"] for todo in todoer.search(["milk"]).todo_list] == [1]
+    if backend == "json":
+        db_path.write_text(json.dumps([{"ID": 1, "Description": "Get some milk.", "Priority": 2, "Done": False},
+                                       {"ID": 2, "Description": "More milk.", "Priority": 1, "Done": False}]))
+    else:
+        with sqlite3.connect(db_path) as connection:
+            connection.execute("INSERT INTO todos (id, description, priority, done) VALUES (2, 'More milk.', 1, 0)")
+    assert [todo["ID"] for todo in todoer.search(["milk"]).todo_list] == [1, 2]
+    assert [todo["ID"] for todo in todoer.query(priority=1).todo_list] == [2]
+    todoer.add(["Bread"]) #The index is current again, so writes update it in place
+    todoer._search_index.rebuild = None
+    assert [todo["ID"] for todo in todoer.query(priority=2).todo_list] == [1, 3]
+
+def test_index_in_session(mock_json_file): #A session's searches don't stamp the index with a state its list doesn't match
+    todoer = clitodo.Todoer(mock_json_file)
+    with todoer.transaction(hold_lock=False):
+        clitodo.Todoer(mock_json_file).add(["More", "milk"]) #Written by another process after the session read the database
+        assert [todo["ID"] for todo in todoer.search(["milk"]).todo_list] == [1]
+        todoer.add(["Milk", "bread"])
+        assert [todo["ID"] for todo in todoer.search(["milk"]).todo_list] == [1, 2]
+    assert [todo["ID"] for todo in todoer.search(["milk"]).todo_list] == [1, 2]
+    with todoer.transaction(hold_lock=False):
+        todoer.add(["Milk", "bread"])
+        assert [todo["ID"] for todo in todoer.search(["bread"]).todo_list] == [3]
+        assert todoer.flush() == SUCCESS
+    assert [todo["ID"] for todo in todoer.search(["milk"]).todo_list] == [1, 2, 3]
+
+def test_query(db_path, backend): #Filtered listings come from the priority and done indexes
+    todoer = clitodo.Todoer(db_path, backend)
+    todoer.add_many([(["Low"], 3), (["High"], 1), (["Urgent"], 1)])
+    assert [todo["ID"] for todo in todoer.query(sort="priority").todo_list] == [3, 4, 1, 2]
+    todoer._search_index.rebuild = None #Changes below must update the indexes in place
+    todoer.set_done(3)
+    todoer.remove(2)
+    assert [todo["ID"] for todo in todoer.query(priority=1, done=False).todo_list] == [4]
+    assert [todo["ID"] for todo in todoer.query(done=False, sort="priority", reverse=True).todo_list] == [1, 4]
+    assert [todo["ID"] for todo in todoer.query(offset=1, limit=1).todo_list] == [3]
+
+def test_profile(mock_json_file, monkeypatch, tmp_path): #--profile-json reports the read and write phases with their bytes
+    monkeypatch.setattr(timing, "enabled", False) #Restored after the test, so other tests run without timers
+    monkeypatch.setattr(timing, "_phases", {})
+    monkeypatch.setattr(cli, "get_todoer", lambda: clitodo.Todoer(mock_json_file))
+    report_file = tmp_path / "profile.json"
+    result = runner.invoke(cli.app, ["--profile-json", str(report_file), "add", "Buy", "bread"])
+    assert result.exit_code == 0
+    phases = json.loads(report_file.read_text())["phases"]
+    assert phases["read"]["calls"] == 1
+    assert phases["write"]["bytes"] == mock_json_file.stat().st_size
+    assert sum(phase["ms"] for phase in phases.values()) > 0
+    monkeypatch.setattr(timing, "enabled", False)
+    monkeypatch.chdir(tmp_path)
+    result = runner.invoke(cli.app, ["add", "Buy", "milk"], env={"CLITODO_TRACE": "0"}) #0 turns tracing off instead of naming a file
+    assert result.exit_code == 0
+    assert not timing.enabled and not (tmp_path / "0").exists()
+
+def test_async_todoer(db_path, backend): #Concurrent callers get their own results from coalesced writes
+    async def run():
+        async with AsyncTodoer(db_path, backend) as todoer:
+            added = await asyncio.gather(*(todoer.add([f"Task {number}"]) for number in range(20)))
+            done, missing = await asyncio.gather(todoer.set_done(1), todoer.remove(99))
+            mixed = await asyncio.gather(todoer.add(["Before"]), todoer.add([None]), todoer.add(["After"]), return_exceptions=True)
+            return added, done, missing, mixed, await todoer.get_todo_list()
+
+    added, done, missing, mixed, todo_list = asyncio.run(run())
+    assert sorted(todo.todo["ID"] for todo in added) == list(range(2, 22))
+    assert all(todo.error == SUCCESS for todo in added)
+    assert done.todo["Done"] and missing.error == ID_ERROR
+    assert isinstance(mixed[1], TypeError) #Only the bad request fails, the batch around it is still written
+    assert mixed[0].error == SUCCESS and mixed[2].error == SUCCESS
+    assert len(todo_list) == 23
+    assert database.get_database_handler(db_path, backend).version() < 20 #Fewer writes than adds
+
+def test_named_lists(mock_json_file, monkeypatch, tmp_path): #Each list has its own shard and --all-lists merges them
+    monkeypatch.setattr(config, "CONFIG_DIR_PATH", tmp_path)
+    monkeypatch.setattr(config, "CONFIG_FILE_PATH", tmp_path / "config.ini")
+    monkeypatch.setattr(cli, "_list_name", DEFAULT_LIST)
+    assert config.init_app(str(mock_json_file)) == SUCCESS
+    default_content = mock_json_file.read_bytes()
+    for name in ("work", "home", "work"):
+        result = runner.invoke(cli.app, ["--list", name, "add", f"Task for {name}", "-p", "1"])
+        assert result.exit_code == 0
+    assert mock_json_file.read_bytes() == default_content #Other lists never rewrite the default one
+    lists = database.get_list_settings(config.CONFIG_FILE_PATH)
+    assert list(lists) == [DEFAULT_LIST, "work", "home"]
+    assert len(clitodo.Todoer(lists["work"].path).get_todo_list()) == 2
+    result = runner.invoke(cli.app, ["list", "--all-lists", "--priority", "1"])
+    assert result.exit_code == 0
+    assert "Get some milk." not in result.stdout #Priority 2, filtered out in the worker process
+    assert result.stdout.count("Task for work.") == 2 and "home to-do list" in result.stdout
+    with cli._warm_session() as todoer: #A session keeps to the list it was started on
+        assert cli._run_command(todoer, ["--list", "home", "add", "Misplaced"]) != 0
+        assert cli._list_name == DEFAULT_LIST
+        assert cli._run_command(todoer, ["--list", DEFAULT_LIST, "add", "Session task"]) == 0
+    assert len(clitodo.Todoer(lists["home"].path).get_todo_list()) == 1
+    assert [todo.description for todo in clitodo.Todoer(mock_json_file).get_todo_list()][-1] == "Session task."
+
+def test_export(mock_json_file, monkeypatch, tmp_path): #Filters apply and the CSV can be imported again
+    todoer = clitodo.Todoer(mock_json_file)
+    todoer.add(test_data1["description"], test_data1["priority"])
+    todoer.set_done(1)
+    monkeypatch.setattr(cli, "get_todoer", lambda: todoer)
+    result = runner.invoke(cli.app, ["export", "--pending", "-f", "csv"])
+    assert result.exit_code == 0
+    assert result.stdout.splitlines() == ["ID,Description,Priority,Done,Due,Repeat", "2,Clean the house.,1,False,,"]
+    result = runner.invoke(cli.app, ["export", "-o", str(tmp_path / "todos.json")])
+    assert result.exit_code == 0
+    assert json.loads((tmp_path / "todos.json").read_text()) == [todo.to_dict() for todo in todoer.get_todo_list()]
+
+def test_export_memory(tmp_path): #Peak memory doesn't grow with the size of the database
+    peaks = []
+    for size in (2000, 20000):
+        db_path = tmp_path / f"todo{size}.json"
+        database.get_database_handler(db_path).load_todos(database.ToDo(f"To-do {number}.") for number in range(size))
+        with open(os.devnull, "w") as out:
+            tracemalloc.start()
+            assert export_todos(clitodo.Todoer(db_path).stream_todos(), out, "ndjson") == size
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    assert peaks[1] < peaks[0] * 2
+
+def test_archive(db_path, backend, monkeypatch): #Done to-dos move to a segment and can still be listed
+    todoer = clitodo.Todoer(db_path, backend, auto_archive=2)
+    for description in ("Clean", "Wash", "Cook"):
+        todoer.add([description])
+    todoer.set_done(1)
+    todoer.set_done(2)
+    assert len(todoer.get_todo_list()) == 4 #Two done to-dos aren't more than the threshold
+    todoer.set_done(4)
+    assert [todo.id for todo in todoer.get_todo_list()] == [3]
+    assert [todo.id for todo in todoer.iter_archived()] == [1, 2, 4]
+    assert todoer.add(["Shop"]).todo["ID"] == 5 #Archived IDs aren't handed out again
+    todoer.set_done(5)
+    assert [todo.id for todo in todoer.archive().todo_list] == [5] #A single done to-do is archived too
+    monkeypatch.setattr(cli, "get_todoer", lambda: todoer)
+    result = runner.invoke(cli.app, ["list", "--include-archived", "--priority", "2"])
+    assert result.exit_code == 0
+    assert "archived to-do list" in result.stdout and "Get some milk." in result.stdout
+    with todoer.transaction(hold_lock=False): #Sessions refuse archive, a failed flush couldn't take the segment back
+        assert cli._run_command(todoer, ["archive"]) == 1
+        with pytest.raises(RuntimeError):
+            todoer.archive()
+
+def test_due(db_path, backend, monkeypatch): #Due to-dos come back soonest first and recurring ones move along
+    todoer = clitodo.Todoer(db_path, backend)
+    today = clitodo.date(2026, 1, 30)
+    assert todoer.add(["Pay rent"], due="2026-01-31", repeat="month").error == SUCCESS
+    assert todoer.add(["Water plants"], due="2026-01-29").error == SUCCESS #Overdue still counts
+    assert todoer.add(["Renew passport"], due="2026-06-01").error == SUCCESS
+    assert todoer.add(["Bad"], due="2026-02-30").error == DUE_ERROR
+    assert todoer.add(["Bad"], repeat="week").error == DUE_ERROR
+    assert [todo.id for todo in todoer.due(3, today).todo_list] == [3, 2]
+    todoer.set_done(2)
+    following = todoer.get_todo_list()[-1] #Completing a recurring to-do adds its next occurrence
+    assert (following.id, following.due, following.repeat) == (5, "2026-02-28", "month")
+    assert todoer.set_done(2).error == SUCCESS #Completing it again doesn't add another occurrence
+    with todoer.transaction():
+        todoer.set_done(2)
+    assert [todo.id for todo in todoer.get_todo_list()] == [1, 2, 3, 4, 5]
+    assert [todo.id for todo in todoer.due(30, today).todo_list] == [3, 5]
+    assert todoer.due(30, today, limit=1).todo_list[0]["Due"] == "2026-01-29"
+    monkeypatch.setattr(cli, "get_todoer", lambda: todoer)
+    result = runner.invoke(cli.app, ["due", "--within", "10000d"])
+    assert result.exit_code == 0
+    assert "| 2026-06-01  | Renew passport." in result.stdout
+
+def test_recurring_done_reads_once(mock_json_file, monkeypatch): #Completing a recurring to-do reads the JSON file once, like any completion
+    todoer = clitodo.Todoer(mock_json_file)
+    todoer.add(["Pay rent"], due="2026-01-31", repeat="month")
+    reads = []
+    read_todos = todoer._db_handler.read_todos
+    monkeypatch.setattr(todoer._db_handler, "read_todos", lambda: reads.append(1) or read_todos())
+    assert todoer.set_done(2).error == SUCCESS
+    assert todoer.set_done(1).error == SUCCESS
+    assert len(reads) == 2
+    assert [todo.due for todo in todoer.get_todo_list()] == [None, "2026-01-31", "2026-02-28"]